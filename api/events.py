@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import secrets
+import threading
+from collections import defaultdict
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessSubscription:
+    def __init__(self, broker, department_id):
+        self.broker = broker
+        self.department_id = department_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Delivers board events to subscribers running in the same process.
+    Use RedisBroker when the app is served by several worker processes.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, department_id):
+        subscription = InProcessSubscription(self, department_id)
+        with self._lock:
+            self._subscriptions[department_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.department_id].discard(subscription)
+
+    def publish(self, department_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(department_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    subscription.queue.put_nowait, event
+                )
+            except RuntimeError:
+                # Event loop of the subscriber is already closed
+                self.unsubscribe(subscription)
+
+
+class RedisSubscription:
+    def __init__(self, url, channel):
+        self.channel = channel
+        self.client = aioredis.Redis.from_url(url)
+        self.pubsub = self.client.pubsub()
+        self.subscribed = False
+
+    async def get(self):
+        if not self.subscribed:
+            await self.pubsub.subscribe(self.channel)
+            self.subscribed = True
+        while True:
+            message = await self.pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=None
+            )
+            if message:
+                return json.loads(message["data"])
+
+    async def close(self):
+        await self.pubsub.close()
+        await self.client.close()
+
+
+class RedisBroker:
+    """
+    Delivers board events through Redis pub/sub, across all worker processes.
+    """
+
+    channel_prefix = "kan:board:"
+
+    def __init__(self, url=None):
+        self.url = url or settings.BOARD_EVENTS_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+
+    def channel(self, department_id):
+        return f"{self.channel_prefix}{department_id}"
+
+    def subscribe(self, department_id):
+        return RedisSubscription(self.url, self.channel(department_id))
+
+    def publish(self, department_id, event):
+        self.client.publish(
+            self.channel(department_id), json.dumps(event, cls=DjangoJSONEncoder)
+        )
+
+
+_brokers = {}
+
+
+def get_broker():
+    broker_path = settings.BOARD_EVENTS_BROKER
+    if broker_path not in _brokers:
+        _brokers[broker_path] = import_string(broker_path)()
+    return _brokers[broker_path]
+
+
+def publish_board_event(department_id, event_type, data):
+    """
+    Publish event to the board of the department once the current transaction is committed.
+    """
+    event = {"type": event_type, "department": department_id, "data": data}
+
+    def publish():
+        try:
+            get_broker().publish(department_id, event)
+        except Exception:
+            logger.exception(f"Board event {event_type} was not published")
+
+    transaction.on_commit(publish)
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+STREAM_TICKET_KEY = "event_stream_ticket:{}"
+
+
+def issue_stream_ticket(user_id):
+    """
+    Single-use ticket to open the event stream. EventSource can't send headers,
+    and access tokens in the URL would be written to access logs.
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(STREAM_TICKET_KEY.format(ticket), user_id, settings.BOARD_EVENTS_TICKET_LIFETIME)
+    return ticket
+
+
+def redeem_stream_ticket(ticket):
+    """Id of the user the ticket was issued to, None for unknown or used tickets."""
+    key = STREAM_TICKET_KEY.format(ticket)
+    user_id = cache.get(key)
+    # Only the request that deletes the ticket may use it
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
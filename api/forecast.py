@@ -0,0 +1,119 @@
+import statistics
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from api.choices import Statuses
+from api.models import Task, TaskForecast, TaskTimeRollup, TimeTracker
+from kanban.settings import business_calendar
+
+# Statuses a task still has to pass, in the board order
+WORKFLOW = [status.value for status in Statuses if status != Statuses.DONE]
+ESTIMATES = {
+    Statuses.EDITING.value: "editing_time_estimate",
+    Statuses.CORRECTING.value: "correcting_time_estimate",
+    Statuses.TC.value: "tc_time_estimate",
+}
+
+
+class HoursModel:
+    """
+    Median hours a task spends in every status, learned from done tasks.
+
+    Samples are grouped by (department, scale, category), then by (scale, category)
+    and by status only; the most specific group with enough samples is used, the
+    estimate of the task when no group has them.
+    """
+
+    def __init__(self, min_samples):
+        self.min_samples = min_samples
+        self.medians = {}
+
+    @staticmethod
+    def _group_keys(department, scale, category, task_status):
+        return [
+            (department, scale, category, task_status),
+            (scale, category, task_status),
+            (task_status,),
+        ]
+
+    def fit(self, rows):
+        """Learn from (department, scale, category, task_status, hours) of done tasks."""
+        samples = defaultdict(list)
+        for department, scale, category, task_status, hours in rows:
+            for key in self._group_keys(department, scale, category, task_status):
+                samples[key].append(hours)
+        self.medians = {
+            key: statistics.median(values)
+            for key, values in samples.items()
+            if len(values) >= self.min_samples
+        }
+        return self
+
+    def hours(self, task, task_status):
+        for key in self._group_keys(task["department_id"], task["scale"], task["category"], task_status):
+            if key in self.medians:
+                return self.medians[key]
+        estimate = ESTIMATES.get(task_status)
+        return task[estimate] if estimate else 0
+
+    def remaining_hours(self, task, spent):
+        """Hours left in the current status, but not less than zero, plus the next statuses."""
+        statuses = WORKFLOW[WORKFLOW.index(task["status"]):]
+        current, *following = statuses
+        return max(self.hours(task, current) - spent, 0) + sum(
+            self.hours(task, task_status) for task_status in following
+        )
+
+
+def refresh_task_forecasts(batch_size=2000):
+    """
+    Recalculate forecasts of all open tasks in one batch: one query for the history,
+    one for open tasks, one for the hours spent in their current statuses (and one
+    for in progress trackers in live hours mode), then forecasts are upserted and
+    forecasts of done tasks removed.
+    """
+    history = TaskTimeRollup.objects.filter(task__status=Statuses.DONE.value).values_list(
+        "task__department_id", "task__scale", "task__category", "task_status", "hours"
+    )
+    model = HoursModel(settings.TASK_FORECAST_MIN_SAMPLES).fit(history.iterator(chunk_size=batch_size))
+
+    open_tasks = Task.objects.exclude(status=Statuses.DONE.value).values(
+        "id", "status", "department_id", "scale", "category", *ESTIMATES.values()
+    )
+    spent = {
+        task_id: hours
+        for task_id, hours in TaskTimeRollup.objects.exclude(task__status=Statuses.DONE.value)
+        .filter(task_status=F("task__status"))
+        .values_list("task_id", "hours")
+    }
+    live_hours = TaskTimeRollup.live_hours(
+        TimeTracker.objects.exclude(task__status=Statuses.DONE.value)
+    )
+
+    time_now = datetime.now()
+    forecasts = []
+    for task in open_tasks.iterator(chunk_size=batch_size):
+        task_spent = spent.get(task["id"], 0) + live_hours.get((task["id"], task["status"]), 0)
+        remaining_hours = round(model.remaining_hours(task, task_spent))
+        forecasts.append(
+            TaskForecast(
+                task_id=task["id"],
+                remaining_hours=remaining_hours,
+                eta=business_calendar.add_working_seconds(time_now, remaining_hours * 3600),
+                updated=time_now,
+            )
+        )
+    with transaction.atomic():
+        TaskForecast.objects.bulk_create(
+            forecasts,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["task"],
+            update_fields=["remaining_hours", "eta", "updated"],
+        )
+        TaskForecast.objects.filter(task__status=Statuses.DONE.value).delete()
+    return len(forecasts)
@@ -0,0 +1,75 @@
+import time
+from datetime import datetime, timedelta
+from random import Random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kanban.settings import business_hours, business_calendar
+
+
+def businesstimedelta_hours(start, end):
+    """Hours the way TimeTracker.save computed them with businesstimedelta."""
+    diff = business_hours.difference(start, end)
+    hours = diff.hours
+    if (diff.seconds / 60) >= 30:
+        hours += 1
+    return hours
+
+
+class Command(BaseCommand):
+    """
+    Django command to check that the business calendar rounds time tracker hours
+    exactly like businesstimedelta and to compare their speed
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=10_000)
+        parser.add_argument(
+            "--max-days", type=int, default=90, help="Longest generated interval in days"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def intervals(self, samples, max_days, random):
+        first = datetime(2022, 1, 1)
+        for _ in range(samples):
+            start = first + timedelta(
+                seconds=random.randint(0, 2 * 365 * 24 * 60 * 60),
+                microseconds=random.randint(0, 999_999),
+            )
+            if random.random() < 0.2:
+                # Borders of working day and lunch break
+                start = start.replace(hour=random.choice([9, 13, 14, 18]), minute=0, second=0)
+            end = start + timedelta(
+                seconds=random.randint(0, max_days * 24 * 60 * 60),
+                microseconds=random.randint(0, 999_999),
+            )
+            yield start, end
+
+    @staticmethod
+    def timed(function, intervals):
+        started = time.perf_counter()
+        results = [function(start, end) for start, end in intervals]
+        return results, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        random = Random(options["seed"])
+        intervals = list(self.intervals(options["samples"], options["max_days"], random))
+
+        expected, old_elapsed = self.timed(businesstimedelta_hours, intervals)
+        actual, new_elapsed = self.timed(business_calendar.hours, intervals)
+
+        mismatches = [
+            (interval, old, new)
+            for interval, old, new in zip(intervals, expected, actual)
+            if old != new
+        ]
+        self.stdout.write(
+            f"businesstimedelta: {old_elapsed * 1000:.1f} ms, "
+            f"business calendar: {new_elapsed * 1000:.1f} ms "
+            f"for {len(intervals)} intervals"
+        )
+        for (start, end), old, new in mismatches[:10]:
+            self.stdout.write(f"{start} - {end}: expected {old}, actual {new}")
+        if mismatches:
+            raise CommandError(f"Found {len(mismatches)} intervals with different hours")
+        self.stdout.write(self.style.SUCCESS("Hours are identical"))
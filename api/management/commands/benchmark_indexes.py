@@ -0,0 +1,158 @@
+import time
+from datetime import datetime, timedelta
+from random import Random
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.choices import TimeTrackerStatuses
+from api.models import Statuses, Department, Task, TimeTracker
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Django command to compare query plans and timings of the hot TaskFilter and
+    TimeTrackerFilter queries with and without the composite indexes.
+    Generated data is created inside a transaction which is rolled back at the end.
+    Dropping the indexes locks the tables until then, so do not run it against production.
+    """
+
+    batch_size = 5000
+    trackers_per_task = 10
+    statuses = [status.value for status in Statuses]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--trackers", type=int, default=500_000, help="Number of generated time trackers"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Runs of every query, the best one is reported"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def generate(self, trackers_count, random):
+        departments = Department.objects.bulk_create(
+            [Department(name=f"benchmark_{num}") for num in range(10)]
+        )
+        tasks_count = max(trackers_count // self.trackers_per_task, 1)
+        tasks = Task.objects.bulk_create(
+            (
+                Task(
+                    name=f"benchmark-{num}",
+                    department=random.choice(departments),
+                    status=random.choice(self.statuses),
+                    year=random.randint(2021, 2024),
+                    quarter=random.randint(1, 4),
+                )
+                for num in range(tasks_count)
+            ),
+            batch_size=self.batch_size,
+        )
+        start = datetime(2023, 1, 2, 9)
+
+        def trackers():
+            last_trackers_from = trackers_count - tasks_count
+            for num in range(trackers_count):
+                task = tasks[num % tasks_count]
+                # Only the last tracker of a task can be in progress
+                in_progress = num >= last_trackers_from and random.random() < 0.2
+                start_time = start + timedelta(hours=num % 5000)
+                yield TimeTracker(
+                    task=task,
+                    task_status=random.choice(self.statuses),
+                    task_department_id=task.department_id,
+                    start_time=start_time,
+                    end_time=None if in_progress else start_time + timedelta(hours=2),
+                    status=(
+                        TimeTrackerStatuses.IN_PROGRESS.value
+                        if in_progress
+                        else TimeTrackerStatuses.DONE.value
+                    ),
+                )
+
+        TimeTracker.objects.bulk_create(trackers(), batch_size=self.batch_size)
+        return departments, tasks
+
+    def queries(self, departments, tasks):
+        task = tasks[len(tasks) // 2]
+        return {
+            "tasks by department, status, year, quarter": Task.objects.filter(
+                department=departments[0],
+                status=Statuses.EDITING.value,
+                year=2023,
+                quarter=2,
+            ),
+            "trackers by task and task_status": TimeTracker.objects.filter(
+                task=task, task_status=Statuses.EDITING.value
+            ),
+            "in progress trackers": TimeTracker.objects.filter(
+                status=TimeTrackerStatuses.IN_PROGRESS.value
+            ),
+            "in progress tracker of task": TimeTracker.objects.filter(
+                task=task, status=TimeTrackerStatuses.IN_PROGRESS.value
+            ),
+        }
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - started)
+            results[name] = (queryset.explain(), min(timings) * 1000)
+        return results
+
+    @staticmethod
+    def indexes():
+        return [
+            (model, index)
+            for model in (Task, TimeTracker)
+            for index in model._meta.indexes
+        ]
+
+    @staticmethod
+    def constraints():
+        """Partial unique constraints, which are indexes of the in progress rows too."""
+        return [
+            (model, constraint)
+            for model in (Task, TimeTracker)
+            for constraint in model._meta.constraints
+        ]
+
+    def handle(self, *args, **options):
+        random = Random(options["seed"])
+        try:
+            with transaction.atomic():
+                self.stdout.write(f"Generating {options['trackers']} time trackers...")
+                departments, tasks = self.generate(options["trackers"], random)
+                queries = self.queries(departments, tasks)
+
+                # Used without entering the context, so the DDL stays in this
+                # transaction and is rolled back together with the data.
+                schema_editor = connection.schema_editor()
+                for model, index in self.indexes():
+                    schema_editor.remove_index(model, index)
+                for model, constraint in self.constraints():
+                    schema_editor.remove_constraint(model, constraint)
+                without_indexes = self.measure(queries, options["repeat"])
+                for model, index in self.indexes():
+                    schema_editor.add_index(model, index)
+                for model, constraint in self.constraints():
+                    schema_editor.add_constraint(model, constraint)
+                with_indexes = self.measure(queries, options["repeat"])
+
+                for name in queries:
+                    plan, indexed_ms = with_indexes[name]
+                    plan_without, plain_ms = without_indexes[name]
+                    self.stdout.write(self.style.MIGRATE_HEADING(name))
+                    self.stdout.write(f"  without indexes: {plain_ms:.2f} ms\n    {plan_without}")
+                    self.stdout.write(f"  with indexes:    {indexed_ms:.2f} ms\n    {plan}")
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS("Generated data is rolled back"))
@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from api.choices import TimeTrackerStatuses
+from api.models import Task, TimeTracker
+from api.workflow import PROGRESS_STATUSES
+
+
+class Command(BaseCommand):
+    """
+    Django command to list rows breaking task_in_progress_user_uniq and
+    tracker_in_progress_task_uniq, run it before migration 0010.
+    Only columns of the tables before the migration are read.
+    """
+
+    def handle(self, *args, **options):
+        found = 0
+
+        user_tasks = defaultdict(list)
+        busy_users = (
+            Task.objects.filter(status__in=PROGRESS_STATUSES, user__isnull=False)
+            .values("user_id")
+            .order_by()
+            .annotate(tasks=Count("id"))
+            .filter(tasks__gt=1)
+            .values("user_id")
+        )
+        for user_id, task_id, name, status in (
+            Task.objects.filter(status__in=PROGRESS_STATUSES, user_id__in=busy_users)
+            .order_by("user_id", "id")
+            .values_list("user_id", "id", "name", "status")
+        ):
+            user_tasks[user_id].append(f"{task_id} {name} ({status})")
+        for user_id, tasks in user_tasks.items():
+            self.stdout.write(f"User {user_id}: tasks in progress {', '.join(tasks)}")
+        found += len(user_tasks)
+
+        for row in (
+            TimeTracker.objects.filter(status=TimeTrackerStatuses.IN_PROGRESS)
+            .values("task_id")
+            .order_by("task_id")
+            .annotate(trackers=Count("id"))
+            .filter(trackers__gt=1)
+        ):
+            self.stdout.write(
+                f"Task {row['task_id']}: {row['trackers']} trackers in progress, "
+                f"all but the last are closed by the migration"
+            )
+            found += 1
+
+        if user_tasks:
+            raise CommandError(
+                f"Found {found} violations. Move extra tasks of the users to a queue "
+                f"status or unassign them before the migration"
+            )
+        if found:
+            self.stdout.write(f"Found {found} violations, the migration resolves them")
+            return
+        self.stdout.write(self.style.SUCCESS("No tasks or time trackers break the constraints"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import TaskTimeRollup
+
+
+class Command(BaseCommand):
+    """Django command to rebuild task time rollups from time trackers and verify them"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify-only",
+            action="store_true",
+            help="Only compare rollups with time trackers, do not rebuild",
+        )
+
+    def verify(self):
+        mismatches = TaskTimeRollup.mismatches()
+        for task_id, task_status, expected, actual in mismatches:
+            self.stdout.write(
+                f"Task {task_id} {task_status}: expected {expected}, actual {actual}"
+            )
+        if mismatches:
+            raise CommandError(f"Found {len(mismatches)} inconsistent rollups")
+        self.stdout.write(self.style.SUCCESS("Rollups are consistent"))
+
+    def handle(self, *args, **options):
+        if not options["verify_only"]:
+            self.stdout.write("Rebuilding task time rollups...")
+            created = TaskTimeRollup.rebuild()
+            self.stdout.write(f"Created {created} rollups")
+        self.verify()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.timeline import TimelineScanner
+
+
+class Command(BaseCommand):
+    """Django command to find and optionally repair inconsistent time tracker timelines"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Repair overlaps, gaps, in progress trackers in the middle and stored hours",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        scanner = TimelineScanner(repair=options["repair"], batch_size=options["batch_size"])
+        for anomaly in scanner.scan():
+            self.stdout.write(
+                f"Task {anomaly['task']}, tracker {anomaly['tracker']}: "
+                f"{anomaly['kind']}, {anomaly['message']}"
+            )
+        if not scanner.counts:
+            self.stdout.write(self.style.SUCCESS("Time trackers are consistent"))
+            return
+        summary = ", ".join(f"{kind}: {count}" for kind, count in sorted(scanner.counts.items()))
+        if options["repair"]:
+            self.stdout.write(f"Found {summary}. Repaired {scanner.repaired} time trackers")
+        else:
+            raise CommandError(f"Found {summary}")
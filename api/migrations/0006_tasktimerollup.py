@@ -0,0 +1,52 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:39
+
+from django.db import migrations, models
+from django.db.models import Sum, Count, Max
+import django.db.models.deletion
+
+
+def fill_up_time_rollups(apps, schema_editor):
+    TimeTracker = apps.get_model('api', 'TimeTracker')
+    TaskTimeRollup = apps.get_model('api', 'TaskTimeRollup')
+    totals = TimeTracker.objects.values('task_id', 'task_status').order_by().annotate(
+        total_hours=Sum('hours'), total_trackers=Count('id'), max_end_time=Max('end_time')
+    )
+    TaskTimeRollup.objects.bulk_create(
+        [
+            TaskTimeRollup(
+                task_id=row['task_id'],
+                task_status=row['task_status'],
+                hours=row['total_hours'] or 0,
+                trackers_count=row['total_trackers'],
+                last_end_time=row['max_end_time'],
+            )
+            for row in totals.iterator()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_task_map_sheet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTimeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_status', models.CharField(choices=[('EDITING_QUEUE', 'Черга виконання'), ('EDITING', 'Виконання'), ('CORRECTING_QUEUE', 'Черга коректури'), ('CORRECTING', 'Коректура'), ('TC_QUEUE', 'Черга технічного контролю'), ('TC', 'Технічний контроль'), ('DONE', 'Завершено')], max_length=64, verbose_name='Статус задачі')),
+                ('hours', models.IntegerField(default=0, verbose_name='Час виконання')),
+                ('trackers_count', models.PositiveIntegerField(default=0, verbose_name='Кількість трекерів')),
+                ('last_end_time', models.DateTimeField(blank=True, null=True, verbose_name='Час закінчення останнього трекера')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_rollups', to='api.task', verbose_name='Задача')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tasktimerollup',
+            constraint=models.UniqueConstraint(fields=('task', 'task_status'), name='unique_task_time_rollup'),
+        ),
+        migrations.RunPython(fill_up_time_rollups, migrations.RunPython.noop),
+    ]
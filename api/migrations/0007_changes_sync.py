@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_tasktimerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(choices=[('task', 'Задача'), ('time_tracker', 'Трекер'), ('comment', 'Коментар')], max_length=32, verbose_name='Модель')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Ідентифікатор')),
+                ('deleted', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Видалено')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='timetracker',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Змінено'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Змінено'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_changes_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['department', 'status', 'year', 'quarter'], name='task_dep_status_year_q_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timetracker',
+            index=models.Index(fields=['task', 'task_status'], name='tracker_task_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timetracker',
+            index=models.Index(fields=['status'], name='tracker_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timetracker',
+            index=models.Index(condition=models.Q(('status', 'IN_PROGRESS')), fields=['task'], name='tracker_in_progress_idx'),
+        ),
+    ]
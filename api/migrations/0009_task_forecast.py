@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remaining_hours', models.IntegerField(default=0, verbose_name='Залишок часу')),
+                ('eta', models.DateTimeField(blank=True, null=True, verbose_name='Очікуване завершення')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Змінено')),
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='api.task', verbose_name='Задача')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:29
+
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+PROGRESS_STATUSES = ['EDITING', 'CORRECTING', 'TC']
+
+# Working time as of this migration, the business calendar of the project may change later
+WORKING_DAYS = {0, 1, 2, 3, 4}
+WORKING_INTERVALS = [(time(9), time(13)), (time(14), time(18))]
+
+
+def working_hours(start, end):
+    """Working hours between two moments, rounded up from half an hour."""
+    working_time = timedelta()
+    day = start.date()
+    while day <= end.date():
+        if day.weekday() in WORKING_DAYS:
+            for interval_start, interval_end in WORKING_INTERVALS:
+                period_start = max(start, datetime.combine(day, interval_start))
+                period_end = min(end, datetime.combine(day, interval_end))
+                if period_start < period_end:
+                    working_time += period_end - period_start
+        day += timedelta(days=1)
+    hours, rest = divmod(working_time, timedelta(hours=1))
+    return hours + 1 if rest >= timedelta(minutes=30) else hours
+
+
+def check_users_in_progress(apps, schema_editor):
+    """Several tasks in progress of one user are left to people, see check_in_progress_constraints."""
+    Task = apps.get_model('api', 'Task')
+    users = list(
+        Task.objects.filter(status__in=PROGRESS_STATUSES, user__isnull=False)
+        .values('user_id').order_by().annotate(tasks=Count('id')).filter(tasks__gt=1)
+        .values_list('user_id', flat=True)
+    )
+    if users:
+        raise RuntimeError(
+            f"Users {', '.join(map(str, users))} have several tasks in progress. "
+            f"List them with 'manage.py check_in_progress_constraints', move extra tasks "
+            f"to a queue status or unassign them and run the migration again."
+        )
+
+
+def close_duplicated_trackers(apps, schema_editor):
+    """
+    Keep only the last tracker in progress of a task, the others are closed when it starts.
+    Hours of the closed trackers and time rollups of their task statuses are recounted.
+    """
+    TimeTracker = apps.get_model('api', 'TimeTracker')
+    TaskTimeRollup = apps.get_model('api', 'TaskTimeRollup')
+    in_progress = TimeTracker.objects.filter(status='IN_PROGRESS')
+    duplicated = in_progress.values('task_id').order_by().annotate(
+        trackers=Count('id'), last_id=Max('id')
+    ).filter(trackers__gt=1)
+    time_now = datetime.now()
+    closed = []
+    for row in duplicated.iterator():
+        last_tracker = TimeTracker.objects.get(id=row['last_id'])
+        end_time = last_tracker.start_time or time_now
+        for tracker in in_progress.filter(task_id=row['task_id']).exclude(id=last_tracker.id):
+            tracker.status = 'DONE'
+            tracker.end_time = max(end_time, tracker.start_time or end_time)
+            if tracker.start_time:
+                tracker.hours = working_hours(tracker.start_time, tracker.end_time)
+            tracker.updated = time_now
+            closed.append(tracker)
+    TimeTracker.objects.bulk_update(closed, ['status', 'end_time', 'hours', 'updated'])
+
+    for task_id, task_status in {(tracker.task_id, tracker.task_status) for tracker in closed}:
+        totals = TimeTracker.objects.filter(task_id=task_id, task_status=task_status).aggregate(
+            total_hours=Sum('hours'), total_trackers=Count('id'), max_end_time=Max('end_time')
+        )
+        TaskTimeRollup.objects.update_or_create(
+            task_id=task_id,
+            task_status=task_status,
+            defaults={
+                'hours': totals['total_hours'] or 0,
+                'trackers_count': totals['total_trackers'],
+                'last_end_time': totals['max_end_time'],
+            },
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_task_forecast'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_users_in_progress, migrations.RunPython.noop),
+        migrations.RunPython(close_duplicated_trackers, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='timetracker',
+            name='tracker_in_progress_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['EDITING', 'CORRECTING', 'TC'])), fields=('user',), name='task_in_progress_user_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='timetracker',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'IN_PROGRESS')), fields=('task',), name='tracker_in_progress_task_uniq'),
+        ),
+    ]
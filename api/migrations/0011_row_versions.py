@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_in_progress_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Версія'),
+        ),
+        migrations.AddField(
+            model_name='timetracker',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Версія'),
+        ),
+    ]
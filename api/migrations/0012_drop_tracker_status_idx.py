@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 23:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_row_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timetracker',
+            name='tracker_status_idx',
+        ),
+    ]
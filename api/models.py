@@ -1,23 +1,28 @@
 from datetime import datetime, date
 
 import regex
+from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth.models import (
     BaseUserManager,
     AbstractBaseUser,
     PermissionsMixin,
 )
-from django.db.models import Sum
+from django.db.models import Sum, Q, F, Value, Count, Max
+from django.db.models.functions import Coalesce, Greatest
 from rest_framework.exceptions import ValidationError
 
 from api.CONSTANTS import TASK_NAME_REGEX, TASK_NAME_RULES
 from api.choices import UserRoles, TimeTrackerStatuses, Statuses, TaskScales, YearQuarter
+from api.events import publish_board_event
 from api.fields import RangeIntegerField
-from kanban.settings import business_hours
+from kanban.settings import business_calendar
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.db.models.base import ModelBase
 from django.db.models.manager import Manager
+from django.utils.functional import cached_property
 
 
 class GetObjectManager(Manager):
@@ -51,6 +56,42 @@ class UpdatedModel(models.Model, metaclass=MetaModelBase):
         return [f.name for f in cls._meta.fields]
 
 
+class VersionedModel(UpdatedModel):
+    """
+    Model with a row version for optimistic concurrency control. Every save of
+    a stored row increments the version, which is exposed as the ETag of the row.
+    """
+    version = models.PositiveIntegerField(default=1, verbose_name="Версія")
+
+    class Meta:
+        abstract = True
+
+    @property
+    def etag(self):
+        return f'"{self.version}"'
+
+    def claim_version(self, version):
+        """
+        Increment the version by a conditional UPDATE ... WHERE version=<version>,
+        so no lock is held between the read and the write of the row.
+        The next save does not increment it again. Returns False on conflict.
+        """
+        if not type(self).objects.filter(pk=self.pk, version=version).update(
+            version=version + 1
+        ):
+            return False
+        self.version = version + 1
+        self._version_claimed = True
+        return True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not self.__dict__.pop("_version_claimed", False):
+            self.version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        super().save(*args, **kwargs)
+
+
 class UserManager(BaseUserManager, GetObjectManager):
     def create_user(
         self,
@@ -124,7 +165,7 @@ class User(AbstractBaseUser, UpdatedModel, PermissionsMixin):
 
     @property
     def is_head_department(self):
-        if self.department and self.department.head.id == self.id:
+        if self.department and self.department.head_id == self.id:
             return True
         return False
 
@@ -136,78 +177,6 @@ class User(AbstractBaseUser, UpdatedModel, PermissionsMixin):
     def is_superuser(self):
         return self.is_admin
 
-    def can_be_set_as_task_user(self, status, request_user):
-        if status in [
-            Statuses.EDITING_QUEUE.value,
-            Statuses.EDITING.value,
-        ] and self.role not in [UserRoles.EDITOR.value, UserRoles.CORRECTOR.value]:
-            raise ValidationError(
-                {
-                    "status": f"Для статусу '{Statuses[status].label}' не можна призначити користувача, роль якого '{UserRoles[self.role].label}'."
-                }
-            )
-
-        if status in [
-            Statuses.CORRECTING_QUEUE.value,
-            Statuses.CORRECTING.value,
-        ] and self.role != UserRoles.CORRECTOR.value:
-            raise ValidationError(
-                {
-                    "status": f"Для статусу '{Statuses[status].label}' можна призначити тільки користувача роль, якого '{UserRoles.CORRECTOR.label}'."
-                }
-            )
-
-        if status in [
-            Statuses.TC_QUEUE.value,
-            Statuses.TC.value,
-        ] and self.role != UserRoles.VERIFIER.value:
-            raise ValidationError(
-                {
-                    "status": f"Для статусу '{Statuses[status].label}' можна призначити тільки користувача роль, якого '{UserRoles.VERIFIER.label}'."
-                }
-            )
-        if not status and (not request_user.is_admin or request_user.is_head_department):
-            raise ValidationError(
-                {
-                    "user": f"Тільки Адміністратор або Керівник віддулу може змінювати виконавця задачі."
-                }
-            )
-
-
-    def can_change_task_status(self, status):
-        if (
-            not self.is_admin
-            and self.role == UserRoles.EDITOR.value
-            and status not in Statuses.EDITORS_STATUSES()
-        ):
-            raise ValidationError(
-                {
-                    "status": "Виконавець може змінити статус задачі тільки на 'Черга редагування', 'Редагування', 'Черга коректування'."
-                }
-            )
-
-        if (
-            not self.is_admin
-            and self.role == UserRoles.CORRECTOR.value
-            and status not in Statuses.CORRECTORS_STATUSES()
-        ):
-            raise ValidationError(
-                {
-                    "status": "Коректор не може змінити статус задачі на 'Технічний контроль' та 'Завершено'."
-                }
-            )
-
-        if (
-            not self.is_admin
-            and self.role == UserRoles.VERIFIER.value
-            and status not in Statuses.VERIFIERS_STATUSES()
-        ):
-            raise ValidationError(
-                {
-                    "status": "Контролер не може змінити статус задачі на 'Редагування' та 'Коректування'."
-                }
-            )
-
 
 class Department(UpdatedModel):
     name = models.CharField(max_length=255, unique=True, verbose_name="Відділ")
@@ -228,7 +197,7 @@ class Department(UpdatedModel):
         ordering = ["is_verifier", "id"]
 
 
-class Task(UpdatedModel):
+class Task(VersionedModel):
     name = models.CharField(max_length=255, verbose_name="Назва")
     map_sheet = models.OneToOneField(
         "map_sheet.MapSheet", related_name="task", null=True, verbose_name="Аркуш", on_delete=models.CASCADE
@@ -275,85 +244,170 @@ class Task(UpdatedModel):
         verbose_name="Відділ",
     )
     created = models.DateTimeField(auto_now_add=True, verbose_name="Створено")
-    updated = models.DateTimeField(auto_now=True, verbose_name="Змінено")
+    updated = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Змінено")
     done = models.DateTimeField(blank=True, null=True, verbose_name="Дата завершення")
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["department", "status", "year", "quarter"],
+                name="task_dep_status_year_q_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=Q(status__in=Statuses.STATUSES_PROGRESS()),
+                name="task_in_progress_user_uniq",
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        task_id = self.id
+        result = super().delete(*args, **kwargs)
+        Tombstone.objects.create(model_name=Tombstone.TASK, object_id=task_id)
+        return result
+
+    TIME_DONE_STATUSES = {
+        "editing_time_done": Statuses.EDITING.value,
+        "correcting_time_done": Statuses.CORRECTING.value,
+        "tc_time_done": Statuses.TC.value,
+    }
+
+    @classmethod
+    def time_done_annotations(cls, fields=None):
+        """
+        Annotations with the hours done per status, read from the time rollups
+        in one grouped query. Annotated values are picked up by the
+        *_time_done properties.
+        """
+        return {
+            f"{field}_sum": Coalesce(
+                Sum(
+                    "time_rollups__hours",
+                    filter=Q(time_rollups__task_status=status),
+                ),
+                0,
+            )
+            for field, status in cls.TIME_DONE_STATUSES.items()
+            if fields is None or field in fields
+        }
+
+    def _time_done(self, field):
+        task_status = self.TIME_DONE_STATUSES[field]
+        hours = getattr(self, f"{field}_sum", None)
+        if hours is None:
+            hours_sum = self.task_time_trackers.filter(
+                task_status=task_status
+            ).aggregate(total_hours=Sum("hours"))
+            hours = hours_sum.get("total_hours") or 0
+        if settings.TIME_TRACKER_LIVE_HOURS:
+            # Stored hours of in progress trackers are not refreshed in live hours mode
+            hours += sum(
+                tracker.current_hours - tracker.hours
+                for tracker in self.in_progress_trackers
+                if tracker.task_status == task_status
+            )
+        return hours
+
+    @cached_property
+    def in_progress_trackers(self):
+        prefetched_trackers = getattr(self, "_prefetched_objects_cache", {}).get(
+            "task_time_trackers"
+        )
+        if prefetched_trackers is not None:
+            return [
+                tracker
+                for tracker in prefetched_trackers
+                if tracker.status == TimeTrackerStatuses.IN_PROGRESS
+            ]
+        return list(
+            self.task_time_trackers.filter(status=TimeTrackerStatuses.IN_PROGRESS)
+        )
+
     @property
     def editing_time_done(self):
-        hours_sum = self.task_time_trackers.filter(
-            task_status=Statuses.EDITING.value
-        ).aggregate(total_hours=Sum("hours"))
-        return hours_sum.get("total_hours") or 0
+        return self._time_done("editing_time_done")
 
     @property
     def correcting_time_done(self):
-        hours_sum = self.task_time_trackers.filter(
-            task_status=Statuses.CORRECTING.value
-        ).aggregate(total_hours=Sum("hours"))
-        return hours_sum.get("total_hours") or 0
+        return self._time_done("correcting_time_done")
 
     @property
     def tc_time_done(self):
-        hours_sum = self.task_time_trackers.filter(
-            task_status=Statuses.TC.value
-        ).aggregate(total_hours=Sum("hours"))
-        return hours_sum.get("total_hours") or 0
+        return self._time_done("tc_time_done")
 
     @property
     def involved_users(self):
+        prefetched_trackers = getattr(self, "_prefetched_objects_cache", {}).get(
+            "task_time_trackers"
+        )
+        if prefetched_trackers is not None:
+            users = {
+                tracker.user_id: tracker.user
+                for tracker in prefetched_trackers
+                if tracker.user_id
+            }
+            return [users[user_id] for user_id in sorted(users)]
         return User.objects.filter(user_time_trackers__task_id=self.id).distinct()
 
-    def update_user_in_queue_status(self, status):
-        time_trackers = None
-        is_queue_status = False
-
-        if status == Statuses.EDITING_QUEUE.value:
-            time_trackers = self.task_time_trackers.filter(
-                task_status=Statuses.EDITING.value
-            )
-            is_queue_status = True
+    def last_user_id(self, task_status):
+        """User of the last time tracker of the task in the status."""
+        return self.task_time_trackers.filter(task_status=task_status).values_list(
+            "user_id", flat=True
+        ).last()
 
-        elif status == Statuses.CORRECTING_QUEUE.value:
-            time_trackers = self.task_time_trackers.filter(
-                task_status=Statuses.CORRECTING.value
+    def start_time_tracker(self, start_time=None):
+        """
+        Start the tracker of the current status, the previous one has to be closed.
+        One tracker in progress per task is kept by the tracker_in_progress_task_uniq constraint.
+        Pass the end time of the closed tracker as start_time to keep the timeline without gaps.
+        """
+        try:
+            time_tracker = TimeTracker.objects.create(
+                task=self,
+                user_id=self.user_id,
+                task_status=self.status,
+                task_department_id=self.department_id,
+                start_time=start_time or datetime.now(),
             )
-            is_queue_status = True
-
-        elif status == Statuses.TC_QUEUE.value:
-            time_trackers = self.task_time_trackers.filter(
-                task_status=Statuses.TC.value
+        except IntegrityError:
+            raise ValidationError(
+                {"status": f"Для задачі {self.name} вже запущено трекер часу, оновіть дані та повторіть спробу."}
             )
-            is_queue_status = True
-
-        if time_trackers and time_trackers.exists():
-            self.user = time_trackers.last().user
-            self.save()
-            return
-        if is_queue_status:
-            self.user = None
-            self.save()
-            return
-
-    def start_time_tracker(self):
-        data = {
-            "task": self,
-            "user": self.user,
-            "status": TimeTrackerStatuses.IN_PROGRESS.value,
-            "task_status": self.status,
-            "task_department": self.department,
-        }
-        if not TimeTracker.objects.filter(**data).count():
-            del data["status"]
-            data["start_time"] = datetime.now()
-            return TimeTracker.objects.create(**data)
+        publish_board_event(
+            self.department_id, "tracker_started", time_tracker.get_event_data()
+        )
+        return time_tracker
 
     def create_log_comment(self, log_user, log_text, is_log):
-        return Comment.objects.create(
+        comment = Comment.objects.create(
             task=self, user=log_user, body=log_text, is_log=is_log
         )
+        publish_board_event(
+            self.department_id,
+            "comment_created",
+            {
+                "id": comment.id,
+                "task": self.id,
+                "user": comment.user_id,
+                "body": comment.body,
+                "is_log": comment.is_log,
+            },
+        )
+        return comment
+
+    def get_event_data(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "user": self.user_id,
+            "department": self.department_id,
+        }
 
     @staticmethod
     def check_year_is_correct(year):
@@ -391,7 +445,7 @@ class Task(UpdatedModel):
         return True
 
 
-class TimeTracker(UpdatedModel):
+class TimeTracker(VersionedModel):
     task = models.ForeignKey(
         Task,
         on_delete=models.CASCADE,
@@ -429,17 +483,81 @@ class TimeTracker(UpdatedModel):
         related_name="department_time_trackers",
         verbose_name="Відділ",
     )
+    updated = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Змінено")
 
     def __str__(self):
         return f"{self.task.name} - {self.get_status_display()}"
 
+    TIMESHEET_VERSION_KEY = "timesheet_version:{}"
+
+    @classmethod
+    def timesheet_version(cls, user_id):
+        return cache.get_or_set(cls.TIMESHEET_VERSION_KEY.format(user_id), 0, None)
+
+    @classmethod
+    def invalidate_timesheets(cls, user_ids):
+        """Drop cached timesheets of the users after their trackers are changed."""
+        for user_id in set(user_ids) - {None}:
+            try:
+                cache.incr(cls.TIMESHEET_VERSION_KEY.format(user_id))
+            except ValueError:
+                # Nothing is cached for the user yet
+                pass
+
+    @classmethod
+    def visible_to(cls, user):
+        if user.is_admin:
+            return cls.objects.all()
+        elif user.is_head_department:
+            return cls.objects.filter(user__department_id=user.department.id)
+        else:
+            return cls.objects.filter(user_id=user.id)
+
     class Meta:
         ordering = ["start_time"]
+        indexes = [
+            models.Index(fields=["task", "task_status"], name="tracker_task_status_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["task"],
+                condition=Q(status=TimeTrackerStatuses.IN_PROGRESS.value),
+                name="tracker_in_progress_task_uniq",
+            ),
+        ]
+
+    @property
+    def current_hours(self):
+        """
+        Hours at this moment. In live hours mode hours of in progress trackers
+        are counted from start_time on read, stored hours are final only for closed ones.
+        """
+        if (
+            settings.TIME_TRACKER_LIVE_HOURS
+            and self.status == TimeTrackerStatuses.IN_PROGRESS
+            and self.start_time
+        ):
+            return business_calendar.hours(self.start_time, datetime.now())
+        return self.hours
 
-    def change_status_done(self):
-        self.end_time = datetime.now()
+    def change_status_done(self, end_time=None):
+        self.end_time = end_time or datetime.now()
         self.status = TimeTrackerStatuses.DONE
         self.save()
+        publish_board_event(
+            self.task_department_id, "tracker_stopped", self.get_event_data()
+        )
+
+    def get_event_data(self):
+        return {
+            "id": self.id,
+            "task": self.task_id,
+            "user": self.user_id,
+            "task_status": self.task_status,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "hours": self.hours,
+        }
 
     def _create_tracker(self, data):
         TimeTracker.objects.create(
@@ -453,19 +571,13 @@ class TimeTracker(UpdatedModel):
         )
 
     def handle_update_time(self, changed_time: str, is_start_time: bool):
+        from api.timeline import TaskTimeline
+
         date_obj = datetime.fromisoformat(changed_time)
 
-        previous_tracker = TimeTracker.objects.filter(
-            id__lt=self.id,
-            task__id=self.task.id,
-        ).last()
+        previous_tracker, next_tracker = TaskTimeline.load(self.task).neighbours(self)
         if not self.end_time:
             next_tracker = None
-        else:
-            next_tracker = TimeTracker.objects.filter(
-                id__gt=self.id,
-                task__id=self.task.id,
-            ).first()
 
         if is_start_time and date_obj < self.start_time:
             if not previous_tracker:
@@ -537,16 +649,290 @@ class TimeTracker(UpdatedModel):
             )
             return
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._rollup_values = instance._get_rollup_values()
+        # Timesheets of the loaded user are invalidated too, when the tracker moves to another user
+        instance._loaded_user_id = instance.__dict__.get("user_id")
+        return instance
+
+    def _get_rollup_values(self):
+        fields = ("task_id", "task_status", "hours", "end_time")
+        if any(field not in self.__dict__ for field in fields):
+            return None
+        return tuple(self.__dict__[field] for field in fields)
+
+    def _update_time_rollup(self, created):
+        loaded = getattr(self, "_rollup_values", None)
+        current = self._get_rollup_values()
+        self._rollup_values = current
+
+        if created:
+            TaskTimeRollup.add(
+                self.task_id,
+                self.task_status,
+                hours=self.hours,
+                trackers_count=1,
+                end_time=self.end_time,
+            )
+            return
+        if loaded == current:
+            return
+        if not loaded or loaded[:2] != current[:2] or (loaded[3] and loaded[3] != current[3]):
+            # Moved between rollups or the end time was edited - recount the affected rows
+            if loaded and loaded[:2] != current[:2]:
+                TaskTimeRollup.refresh(*loaded[:2])
+            TaskTimeRollup.refresh(self.task_id, self.task_status)
+            return
+        TaskTimeRollup.add(
+            self.task_id,
+            self.task_status,
+            hours=self.hours - loaded[2],
+            end_time=self.end_time,
+        )
+
     def save(self, *args, **kwargs):
         time_now = self.end_time or datetime.now()
-        minute = 60
-        half_hour = 30
         if self.start_time:
-            diff = business_hours.difference(self.start_time, time_now)
-            self.hours = diff.hours
-            if (diff.seconds / minute) >= half_hour:
-                self.hours += 1
+            self.hours = business_calendar.hours(self.start_time, time_now)
+        created = self._state.adding
         super(TimeTracker, self).save(*args, **kwargs)
+        self._update_time_rollup(created)
+        TimeTracker.invalidate_timesheets([self.user_id, getattr(self, "_loaded_user_id", None)])
+        self._loaded_user_id = self.user_id
+
+    def delete(self, *args, **kwargs):
+        tracker_id = self.id
+        result = super().delete(*args, **kwargs)
+        TaskTimeRollup.refresh(self.task_id, self.task_status)
+        # Time done of the task is changed for the changes sync
+        Task.objects.filter(id=self.task_id).update(updated=datetime.now())
+        TimeTracker.invalidate_timesheets([self.user_id, getattr(self, "_loaded_user_id", None)])
+        Tombstone.objects.create(model_name=Tombstone.TIME_TRACKER, object_id=tracker_id)
+        return result
+
+
+class TaskTimeRollup(UpdatedModel):
+    """
+    Hours spent on a task per task status, maintained from TimeTracker writes.
+    """
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name="time_rollups",
+        verbose_name="Задача",
+    )
+    task_status = models.CharField(
+        max_length=64,
+        choices=Statuses.choices,
+        verbose_name="Статус задачі",
+    )
+    hours = models.IntegerField(default=0, verbose_name="Час виконання")
+    trackers_count = models.PositiveIntegerField(
+        default=0, verbose_name="Кількість трекерів"
+    )
+    last_end_time = models.DateTimeField(
+        null=True, blank=True, verbose_name="Час закінчення останнього трекера"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["task", "task_status"], name="unique_task_time_rollup"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} - {self.task_status}: {self.hours}"
+
+    TOTALS = {
+        "total_hours": Coalesce(Sum("hours"), 0),
+        "total_trackers": Count("id"),
+        "max_end_time": Max("end_time"),
+    }
+
+    @classmethod
+    def add(cls, task_id, task_status, hours=0, trackers_count=0, end_time=None):
+        values = {
+            "hours": F("hours") + hours,
+            "trackers_count": F("trackers_count") + trackers_count,
+        }
+        if end_time:
+            values["last_end_time"] = Greatest(
+                Coalesce("last_end_time", Value(end_time)), Value(end_time)
+            )
+        rollup = cls.objects.filter(task_id=task_id, task_status=task_status)
+        if rollup.update(**values):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    task_id=task_id,
+                    task_status=task_status,
+                    hours=hours,
+                    trackers_count=trackers_count,
+                    last_end_time=end_time,
+                )
+        except IntegrityError:
+            rollup.update(**values)
+
+    @classmethod
+    def add_many(cls, changes):
+        """
+        Apply (task_id, task_status, hours, trackers_count, end_time) changes of
+        many time trackers with one read and two bulk writes.
+        """
+        totals = {}
+        for task_id, task_status, hours, trackers_count, end_time in changes:
+            total = totals.setdefault((task_id, task_status), [0, 0, None])
+            total[0] += hours
+            total[1] += trackers_count
+            if end_time and (not total[2] or end_time > total[2]):
+                total[2] = end_time
+        if not totals:
+            return
+        rollups = {
+            (rollup.task_id, rollup.task_status): rollup
+            for rollup in cls.objects.select_for_update().filter(
+                task_id__in={task_id for task_id, _ in totals},
+                task_status__in={task_status for _, task_status in totals},
+            )
+        }
+        updated = []
+        created = []
+        for (task_id, task_status), (hours, trackers_count, end_time) in totals.items():
+            rollup = rollups.get((task_id, task_status))
+            if not rollup:
+                created.append(
+                    cls(
+                        task_id=task_id,
+                        task_status=task_status,
+                        hours=hours,
+                        trackers_count=trackers_count,
+                        last_end_time=end_time,
+                    )
+                )
+                continue
+            rollup.hours += hours
+            rollup.trackers_count += trackers_count
+            if end_time and (not rollup.last_end_time or end_time > rollup.last_end_time):
+                rollup.last_end_time = end_time
+            updated.append(rollup)
+        cls.objects.bulk_update(updated, ["hours", "trackers_count", "last_end_time"])
+        cls.objects.bulk_create(created)
+
+    @classmethod
+    def live_hours(cls, trackers=None):
+        """
+        Hours of in progress trackers missing from the stored hours by (task_id, task_status).
+        Empty unless TIME_TRACKER_LIVE_HOURS, as otherwise stored hours are refreshed hourly.
+        """
+        if not settings.TIME_TRACKER_LIVE_HOURS:
+            return {}
+        trackers = TimeTracker.objects.all() if trackers is None else trackers
+        time_now = datetime.now()
+        hours = {}
+        for task_id, task_status, start_time, stored_hours in trackers.filter(
+            status=TimeTrackerStatuses.IN_PROGRESS, start_time__isnull=False
+        ).values_list("task_id", "task_status", "start_time", "hours"):
+            key = (task_id, task_status)
+            hours[key] = hours.get(key, 0) + business_calendar.hours(start_time, time_now) - stored_hours
+        return hours
+
+    @classmethod
+    def refresh(cls, task_id, task_status):
+        """
+        Recount one rollup row from its time trackers.
+        """
+        totals = TimeTracker.objects.filter(
+            task_id=task_id, task_status=task_status
+        ).aggregate(**cls.TOTALS)
+        if not totals["total_trackers"]:
+            cls.objects.filter(task_id=task_id, task_status=task_status).delete()
+            return
+        cls.objects.update_or_create(
+            task_id=task_id,
+            task_status=task_status,
+            defaults={
+                "hours": totals["total_hours"],
+                "trackers_count": totals["total_trackers"],
+                "last_end_time": totals["max_end_time"],
+            },
+        )
+
+    @classmethod
+    def expected_rows(cls):
+        """
+        Rollup rows computed from scratch, streamed from the time trackers table.
+        """
+        totals = (
+            TimeTracker.objects.values("task_id", "task_status")
+            .annotate(**cls.TOTALS)
+            .order_by("task_id", "task_status")
+        )
+        for row in totals.iterator(chunk_size=2000):
+            yield cls(
+                task_id=row["task_id"],
+                task_status=row["task_status"],
+                hours=row["total_hours"],
+                trackers_count=row["total_trackers"],
+                last_end_time=row["max_end_time"],
+            )
+
+    @classmethod
+    def rebuild(cls, batch_size=2000):
+        with transaction.atomic():
+            cls.objects.all().delete()
+            batch = []
+            created = 0
+            for rollup in cls.expected_rows():
+                batch.append(rollup)
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            cls.objects.bulk_create(batch)
+            return created + len(batch)
+
+    @classmethod
+    def mismatches(cls):
+        """
+        (task_id, task_status, expected, actual) for every rollup that differs
+        from the time trackers. Expected or actual is None for a missing row.
+        """
+        fields = ("hours", "trackers_count", "last_end_time")
+        actual = {
+            (row[0], row[1]): row[2:]
+            for row in cls.objects.values_list("task_id", "task_status", *fields)
+        }
+        result = []
+        for rollup in cls.expected_rows():
+            key = (rollup.task_id, rollup.task_status)
+            expected = tuple(getattr(rollup, field) for field in fields)
+            current = actual.pop(key, None)
+            if current != expected:
+                result.append((*key, expected, current))
+        result.extend((*key, None, current) for key, current in actual.items())
+        return result
+
+
+class TaskForecast(UpdatedModel):
+    """
+    Expected completion of an open task, recalculated in batch by api.forecast.
+    """
+    task = models.OneToOneField(
+        Task,
+        on_delete=models.CASCADE,
+        related_name="forecast",
+        verbose_name="Задача",
+    )
+    remaining_hours = models.IntegerField(default=0, verbose_name="Залишок часу")
+    eta = models.DateTimeField(null=True, blank=True, verbose_name="Очікуване завершення")
+    updated = models.DateTimeField(auto_now=True, verbose_name="Змінено")
+
+    def __str__(self):
+        return f"{self.task_id}: {self.eta}"
 
 
 class Comment(UpdatedModel):
@@ -566,7 +952,7 @@ class Comment(UpdatedModel):
     )
     body = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
-    updated = models.DateTimeField(auto_now=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
     is_log = models.BooleanField(default=False)
 
     class Meta:
@@ -574,3 +960,31 @@ class Comment(UpdatedModel):
 
     def __str__(self):
         return f"{self.user} commented {self.created}"
+
+    def delete(self, *args, **kwargs):
+        comment_id = self.id
+        result = super().delete(*args, **kwargs)
+        Tombstone.objects.create(model_name=Tombstone.COMMENT, object_id=comment_id)
+        return result
+
+
+class Tombstone(UpdatedModel):
+    """
+    Deleted object, kept for clients that sync changes incrementally.
+    Trackers and comments removed together with their task are covered by the task tombstone.
+    """
+    TASK = "task"
+    TIME_TRACKER = "time_tracker"
+    COMMENT = "comment"
+    MODEL_NAMES = (
+        (TASK, "Задача"),
+        (TIME_TRACKER, "Трекер"),
+        (COMMENT, "Коментар"),
+    )
+
+    model_name = models.CharField(max_length=32, choices=MODEL_NAMES, verbose_name="Модель")
+    object_id = models.PositiveBigIntegerField(verbose_name="Ідентифікатор")
+    deleted = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Видалено")
+
+    def __str__(self):
+        return f"<Tombstone {self.model_name} {self.object_id}>"
@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+from kanban import settings
+
+
+class KanCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the view's `cursor_ordering`.
+    Pages are fetched by position, without OFFSET scans and COUNT(*) queries.
+    """
+
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        return view.cursor_ordering
@@ -0,0 +1,10 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class NormalizedJSONRenderer(JSONRenderer):
+    """
+    JSON selected with ?format=normalized. Views render related entities
+    once per response, side-loaded next to the data that refers to them by id.
+    """
+
+    format = "normalized"
@@ -0,0 +1,301 @@
+import statistics
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    When,
+    F,
+    Min,
+    Window,
+    Exists,
+    OuterRef,
+    Q,
+    Sum,
+    Count,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from api.choices import Statuses, UserRoles, YearQuarter
+from api.models import TimeTracker, Department, Task, TaskTimeRollup, User
+from kanban.settings import business_calendar
+
+
+def _distribution(values):
+    """Count, mean and percentiles of the values in hours."""
+    values = sorted(values)
+    if len(values) > 1:
+        percentiles = statistics.quantiles(values, n=100, method="inclusive")
+    else:
+        percentiles = values * 99
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 1),
+        "p50": round(percentiles[49], 1),
+        "p85": round(percentiles[84], 1),
+        "p95": round(percentiles[94], 1),
+        "max": round(values[-1], 1),
+    }
+
+
+def _hours(start, end):
+    return business_calendar.working_seconds(start, end) / 3600
+
+
+def build_flow_report(date_from, date_to, department_id=None):
+    """
+    Cumulative flow per day and lead/cycle time distributions per department,
+    scale and quarter.
+
+    One query reads time trackers of every task that was on the board during
+    the period, ordered by task and start, with the first start of the task and
+    its first start in work calculated by window functions. Tasks done before
+    the period are counted by one more query into the done band. Days in a status
+    are counted with difference arrays over the period, so the work does not
+    depend on tracker lengths.
+    Lead time is working hours from the first tracker to done, cycle time from
+    the first tracker in a work status to done, for tasks done during the period.
+    """
+    period_start = datetime.combine(date_from, datetime.min.time())
+    period_end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+
+    def on_board(task_id):
+        return Exists(
+            TimeTracker.objects.filter(
+                Q(end_time__isnull=True) | Q(end_time__gte=period_start),
+                task_id=task_id,
+                start_time__lt=period_end,
+            )
+        )
+
+    task_window = {"partition_by": [F("task_id")]}
+    trackers = TimeTracker.objects.filter(on_board(OuterRef("task_id")), start_time__isnull=False)
+    # Tasks done before the period are not on the board, but start the done band
+    done_before = Task.objects.filter(done__lt=period_start).exclude(on_board(OuterRef("id")))
+    if department_id:
+        trackers = trackers.filter(task__department_id=department_id)
+        done_before = done_before.filter(department_id=department_id)
+    rows = (
+        trackers.annotate(
+            first_start=Window(Min("start_time"), **task_window),
+            first_work_start=Window(
+                Min(
+                    Case(
+                        When(
+                            task_status__in=Statuses.STATUSES_PROGRESS(),
+                            then="start_time",
+                        )
+                    )
+                ),
+                **task_window,
+            ),
+        )
+        .order_by("task_id", "start_time", "id")
+        .values_list(
+            "task_id",
+            "task_status",
+            "start_time",
+            "end_time",
+            "first_start",
+            "first_work_start",
+            "task__done",
+            "task__department_id",
+            "task__scale",
+            "task__quarter",
+        )
+    )
+
+    days_count = (date_to - date_from).days + 1
+    first_ordinal = date_from.toordinal()
+
+    def day_index(day):
+        return min(max(day.toordinal() - first_ordinal, 0), days_count)
+
+    flow_changes = {status.value: [0] * (days_count + 1) for status in Statuses}
+    flow_changes[Statuses.DONE.value][0] = done_before.count()
+    lead_times = defaultdict(list)
+    cycle_times = defaultdict(list)
+    today = date.today()
+    previous_task_id = None
+    for (
+        task_id,
+        task_status,
+        start_time,
+        end_time,
+        first_start,
+        first_work_start,
+        done,
+        department,
+        scale,
+        quarter,
+    ) in rows:
+        # A task is in the status at the end of the days from its start until the day it ends
+        changes = flow_changes[task_status]
+        changes[day_index(start_time.date())] += 1
+        changes[day_index(end_time.date() if end_time else today + timedelta(days=1))] -= 1
+
+        if task_id == previous_task_id:
+            continue
+        previous_task_id = task_id
+        if done:
+            flow_changes[Statuses.DONE.value][day_index(done.date())] += 1
+            if period_start <= done < period_end:
+                group = (department, scale, quarter)
+                lead_times[group].append(_hours(first_start, done))
+                if first_work_start:
+                    cycle_times[group].append(_hours(first_work_start, done))
+
+    def distributions(times):
+        return [
+            {"department": department, "scale": scale, "quarter": quarter, **_distribution(values)}
+            for (department, scale, quarter), values in sorted(times.items())
+        ]
+
+    return {
+        "from": date_from,
+        "to": date_to,
+        "department": department_id,
+        "days": [
+            date.fromordinal(first_ordinal + offset).isoformat() for offset in range(days_count)
+        ],
+        "cumulative_flow": {
+            status: list(accumulate(changes[:days_count]))
+            for status, changes in flow_changes.items()
+        },
+        "lead_time": distributions(lead_times),
+        "cycle_time": distributions(cycle_times),
+    }
+
+
+def default_report_period():
+    date_to = date.today()
+    return date_to - timedelta(days=settings.REPORTS_DEFAULT_DAYS - 1), date_to
+
+
+def get_flow_report(date_from, date_to, department_id=None, refresh=False):
+    """Flow report from the cache, recalculated when missing or on refresh."""
+    cache_key = f"flow_report:{date_from.isoformat()}:{date_to.isoformat()}:{department_id}"
+    report = None if refresh else cache.get(cache_key)
+    if report is None:
+        report = build_flow_report(date_from, date_to, department_id)
+        cache.set(cache_key, report, settings.REPORTS_CACHE_TIMEOUT)
+    return report
+
+
+def refresh_flow_reports():
+    """Recalculate reports of the default period for the whole board and every department."""
+    date_from, date_to = default_report_period()
+    department_ids = [None, *Department.objects.values_list("id", flat=True)]
+    for department_id in department_ids:
+        get_flow_report(date_from, date_to, department_id, refresh=True)
+    return len(department_ids)
+
+
+CAPACITY_ESTIMATES = {
+    UserRoles.EDITOR.value: ("editing_time_estimate", Statuses.EDITING.value),
+    UserRoles.CORRECTOR.value: ("correcting_time_estimate", Statuses.CORRECTING.value),
+    UserRoles.VERIFIER.value: ("tc_time_estimate", Statuses.TC.value),
+}
+
+
+def quarter_bounds(year, quarter):
+    start = datetime(year, 3 * (quarter - 1) + 1, 1)
+    end = datetime(year + 1, 1, 1) if quarter == 4 else datetime(year, 3 * quarter + 1, 1)
+    return start, end
+
+
+def build_capacity_report(year, department_id=None):
+    """
+    Remaining estimates of not done tasks against working hours of the users
+    for every department, role and quarter of the year.
+
+    Remaining estimate of a task is its estimate minus hours already done in the
+    work status of the role, from task time rollups, never below zero. Available
+    hours are working hours left in the quarter times active users with the role.
+    Technical control of all departments is done by verifiers of the verifier
+    departments, so verifier rows are one per quarter without a department.
+    In live hours mode tasks with trackers in progress are corrected by their live hours.
+    """
+    tasks = Task.objects.filter(year=year).exclude(status=Statuses.DONE.value)
+    users = User.objects.filter(is_active=True, department__isnull=False)
+    if department_id:
+        tasks = tasks.filter(department_id=department_id)
+        users = users.filter(Q(department_id=department_id) | Q(department__is_verifier=True))
+
+    done_hours = {}
+    remaining = {}
+    for role, (estimate, task_status) in CAPACITY_ESTIMATES.items():
+        done = TaskTimeRollup.objects.filter(
+            task_id=OuterRef("pk"), task_status=task_status
+        ).values("hours")[:1]
+        done_hours[f"{role}_done"] = Coalesce(Subquery(done), Value(0))
+        remaining[role] = Sum(Greatest(F(estimate) - done_hours[f"{role}_done"], Value(0)))
+    estimates = list(tasks.order_by().values("department_id", "quarter").annotate(**remaining))
+
+    if live_hours := TaskTimeRollup.live_hours(TimeTracker.objects.filter(task__in=tasks)):
+        rows_by_key = {(row["department_id"], row["quarter"]): row for row in estimates}
+        estimate_fields = [estimate for estimate, _ in CAPACITY_ESTIMATES.values()]
+        for task in (
+            tasks.filter(id__in={task_id for task_id, _ in live_hours})
+            .values("id", "department_id", "quarter", *estimate_fields)
+            .annotate(**done_hours)
+        ):
+            row = rows_by_key[(task["department_id"], task["quarter"])]
+            for role, (estimate, task_status) in CAPACITY_ESTIMATES.items():
+                hours = live_hours.get((task["id"], task_status))
+                if hours:
+                    left = task[estimate] - task[f"{role}_done"]
+                    row[role] = (row[role] or 0) + max(left - hours, 0) - max(left, 0)
+    users_count = defaultdict(int)
+    for row in (
+        users.order_by()
+        .values("department_id", "department__is_verifier", "role")
+        .annotate(count=Count("id"))
+    ):
+        if row["department__is_verifier"]:
+            if row["role"] == UserRoles.VERIFIER.value:
+                users_count[(None, row["role"])] += row["count"]
+        elif row["role"] != UserRoles.VERIFIER.value:
+            users_count[(row["department_id"], row["role"])] += row["count"]
+    departments = dict(Department.objects.values_list("id", "name"))
+
+    time_now = datetime.now()
+    quarter_hours = {}
+    for quarter in YearQuarter.values:
+        start, end = quarter_bounds(year, quarter)
+        quarter_hours[quarter] = _hours(min(max(start, time_now), end), end)
+
+    def capacity_row(department, quarter, role, remaining_hours):
+        count = users_count.get((department, role), 0)
+        available_hours = round(count * quarter_hours[quarter], 1)
+        return {
+            "department": department,
+            "department_name": departments.get(department),
+            "quarter": quarter,
+            "role": role,
+            "users": count,
+            "remaining_hours": remaining_hours,
+            "available_hours": available_hours,
+            "balance": round(available_hours - remaining_hours, 1),
+            "load": round(remaining_hours / available_hours, 2) if available_hours else None,
+        }
+
+    rows = []
+    verifier_remaining = defaultdict(int)
+    for row in estimates:
+        for role in CAPACITY_ESTIMATES:
+            if role == UserRoles.VERIFIER.value:
+                verifier_remaining[row["quarter"]] += row[role] or 0
+                continue
+            rows.append(capacity_row(row["department_id"], row["quarter"], role, row[role] or 0))
+    for quarter, remaining_hours in verifier_remaining.items():
+        rows.append(capacity_row(None, quarter, UserRoles.VERIFIER.value, remaining_hours))
+    rows.sort(
+        key=lambda row: (row["department"] is None, row["department"] or 0, row["quarter"], row["role"])
+    )
+    return {"year": year, "department": department_id, "rows": rows}
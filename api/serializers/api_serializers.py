@@ -1,21 +1,53 @@
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, date, timedelta
 
+from django.db import transaction, IntegrityError
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from api.serializers.map_sheet_serializers import MapSheetSerializer
 from kanban import settings
+from kanban.settings import business_calendar
 from api.models import (
     User,
     Department,
     Task,
     Comment,
     TimeTracker,
+    TaskTimeRollup,
+    TaskScales,
     Statuses,
 )
+from map_sheet.models import MapSheet
 from api.choices import UserRoles, TimeTrackerStatuses
+from api.events import publish_board_event
 
 from api.user_validation.department_validator import DepartmentValidator
+from api.workflow import (
+    PROGRESS_STATUSES,
+    QUEUE_WORK_STATUSES,
+    is_department_bound,
+    transition,
+)
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Serializer that keeps only the `fields` passed on init.
+    Fields listed in Meta.expandable_fields are nested objects, which are
+    rendered only on demand when a subset of fields is requested.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    @classmethod
+    def get_default_sparse_fields(cls):
+        expandable_fields = getattr(cls.Meta, "expandable_fields", ())
+        return [field for field in cls.Meta.fields if field not in expandable_fields]
 
 
 class DepartmentCreateSerializer(serializers.ModelSerializer):
@@ -78,6 +110,13 @@ class UserBaseSerializer(serializers.ModelSerializer):
         ]
 
 
+class UserNormalizedSerializer(UserBaseSerializer):
+    class Meta(UserBaseSerializer.Meta):
+        fields = [
+            field for field in UserBaseSerializer.Meta.fields if field != "department_obj"
+        ]
+
+
 class UserDetailSerializer(UserBaseSerializer):
     pass
 
@@ -147,6 +186,7 @@ class TimeTrackerSerializer(serializers.ModelSerializer):
     status_display_value = serializers.CharField(
         source="get_status_display", read_only=True
     )
+    hours = serializers.IntegerField(source="current_hours", read_only=True)
 
     class Meta:
         model = TimeTracker
@@ -161,8 +201,74 @@ class TimeTrackerSerializer(serializers.ModelSerializer):
             "hours",
             "task_status",
             "task_department",
+            "version",
         ]
-        read_only_fields = ("hours",)
+        read_only_fields = ("hours", "version")
+
+
+class TimeTrackerEditSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    start_time = serializers.DateTimeField(required=False)
+    end_time = serializers.DateTimeField(required=False)
+
+
+class TimeTrackerBulkEditSerializer(serializers.Serializer):
+    task = serializers.PrimaryKeyRelatedField(queryset=Task.objects.all())
+    time_trackers = TimeTrackerEditSerializer(many=True, allow_empty=False)
+
+
+class TimesheetQuerySerializer(serializers.Serializer):
+    MAX_DAYS = 366
+
+    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # "from" is a keyword, so the field can not be declared as an attribute
+        fields["from"] = serializers.DateField()
+        fields["to"] = serializers.DateField()
+        return fields
+
+    def validate(self, attrs):
+        if attrs["from"] > attrs["to"]:
+            raise ValidationError({"to": "Дата закінчення не може бути раніше дати початку."})
+        if (attrs["to"] - attrs["from"]).days >= self.MAX_DAYS:
+            raise ValidationError({"to": f"Період не може бути довшим за {self.MAX_DAYS} днів."})
+        return attrs
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    MAX_DAYS = 366
+
+    department = serializers.PrimaryKeyRelatedField(
+        queryset=Department.objects.all(), required=False
+    )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # "from" is a keyword, so the field can not be declared as an attribute
+        fields["from"] = serializers.DateField(required=False)
+        fields["to"] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        date_to = attrs.get("to") or date.today()
+        date_from = attrs.get("from") or date_to - timedelta(
+            days=settings.REPORTS_DEFAULT_DAYS - 1
+        )
+        if date_from > date_to:
+            raise ValidationError({"to": "Дата закінчення не може бути раніше дати початку."})
+        if (date_to - date_from).days >= self.MAX_DAYS:
+            raise ValidationError({"to": f"Період не може бути довшим за {self.MAX_DAYS} днів."})
+        attrs["from"], attrs["to"] = date_from, date_to
+        return attrs
+
+
+class CapacityReportQuerySerializer(serializers.Serializer):
+    year = serializers.IntegerField(default=settings.CURRENT_YEAR, min_value=2000)
+    department = serializers.PrimaryKeyRelatedField(
+        queryset=Department.objects.all(), required=False
+    )
 
 
 class InvolvedUsersSerializer(serializers.ModelSerializer):
@@ -182,7 +288,7 @@ class InvolvedUsersSerializer(serializers.ModelSerializer):
         ]
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
 
     MAP_SHEET_REQUIRED_FIELDS = ("scale", "name", "year")
 
@@ -207,6 +313,9 @@ class TaskSerializer(serializers.ModelSerializer):
     updated = serializers.DateTimeField(
         read_only=True, format=settings.REST_FRAMEWORK["DATETIME_FORMAT"]
     )
+    eta = serializers.DateTimeField(
+        source="forecast.eta", read_only=True, format=settings.REST_FRAMEWORK["DATETIME_FORMAT"]
+    )
     time_trackers = TimeTrackerSerializer(many=True, read_only=True, source="task_time_trackers")
     map_sheet = MapSheetSerializer(default=None, allow_null=True, read_only=True)
 
@@ -234,10 +343,20 @@ class TaskSerializer(serializers.ModelSerializer):
             "department",
             "department_obj",
             "done",
+            "eta",
             "created",
             "updated",
             "time_trackers",
             "map_sheet",
+            "version",
+        ]
+        read_only_fields = ("version",)
+        expandable_fields = [
+            "user_obj",
+            "involved_users",
+            "department_obj",
+            "time_trackers",
+            "map_sheet",
         ]
 
     def _check_department_not_verifier(self):
@@ -248,37 +367,28 @@ class TaskSerializer(serializers.ModelSerializer):
                     "department": f"Задача не може належати перевіряючему відділу."
                 }
             )
-    def check_user_has_only_one_task_in_progress(self):
-        status = self.validated_data.get("status")
+    def raise_user_task_in_progress_error(self):
+        """
+        One task in progress per user is kept by the task_in_progress_user_uniq
+        constraint, the active task is looked up only after the write fails.
+        """
         user = self.validated_data.get("user") or (
             self.instance.user if self.instance else None
         )
-        if user and status and status in Statuses.STATUSES_PROGRESS():
-            tasks_in_progress = user.user_tasks.filter(
-                status__in=Statuses.STATUSES_PROGRESS()
+        if not user:
+            return
+        task_in_progress = (
+            user.user_tasks.filter(status__in=PROGRESS_STATUSES)
+            .exclude(pk=getattr(self.instance, "pk", None))
+            .values_list("name", flat=True)
+            .first()
+        )
+        if task_in_progress:
+            raise ValidationError(
+                {
+                    "user": f"У користувача {user.username} вже є активна задача {task_in_progress}"
+                }
             )
-            if tasks_in_progress.count() > 0 and any(
-                [task != self.instance for task in tasks_in_progress]
-            ):
-                raise ValidationError(
-                    {
-                        "user": f"У користувача {user.username} вже є активна задача {tasks_in_progress[0].name}"
-                    }
-                )
-
-    def _check_user_for_progress_status(self):
-        stat = self.validated_data.get("status")
-        if (
-            stat
-            and (stat in Statuses.STATUSES_PROGRESS())
-            and not self.validated_data.get("user")
-        ):
-            if not self.instance.user or self.context.get('request').user != self.instance.user:
-                raise ValidationError(
-                    {
-                        "user": f"Для переводу задачі в статус '{Statuses[stat].label}' має бути вказаний виконавець"
-                    }
-                )
 
     def _check_user_is_department_member_of_task_department(self):
         task = self.instance
@@ -311,12 +421,7 @@ class TaskSerializer(serializers.ModelSerializer):
             )
 
         if user and task and not department:
-            if status != Statuses.DONE.value and user.department_id != task.department_id and (
-                #user.role not in [UserRoles.CORRECTOR.value, UserRoles.VERIFIER.value]
-                user.role == UserRoles.EDITOR.value
-                or department_validator.validate_corrector_status()
-                or department_validator.validate_verifier_status()
-            ):
+            if user.department_id != task.department_id and is_department_bound(user.role, status):
                 raise ValidationError(
                     {
                         "department": "Виконавцем можна призначити тільки користувача з відділу для якого створено задачу"
@@ -375,8 +480,26 @@ class TaskSerializer(serializers.ModelSerializer):
         return map_sheet_serializer.save()
 
     def save(self, **kwargs):
+        event_type = "task_updated" if self.instance else "task_created"
+        try:
+            with transaction.atomic():
+                task = self._save(**kwargs)
+        except IntegrityError:
+            self.raise_user_task_in_progress_error()
+            raise
+        publish_board_event(task.department_id, event_type, task.get_event_data())
+        return task
+
+    def _save(self, **kwargs):
         comment_data = self._create_log_data()
-        self.check_user_has_only_one_task_in_progress()
+        task_transition = None
+        if self.instance and (self.validated_data.get("status") or self.validated_data.get("user")):
+            task_transition = transition(
+                self.context["request"].user,
+                self.instance,
+                status=self.validated_data.get("status"),
+                user=self.validated_data.get("user"),
+            )
         self._check_user_is_department_member_of_task_department()
         self._check_department_not_verifier()
 
@@ -400,54 +523,466 @@ class TaskSerializer(serializers.ModelSerializer):
             self.instance.create_log_comment(**comment_data)
             return self.instance
 
+        return self._update(task_transition, map_sheet, comment_data, **kwargs)
+
+    # Queries of TaskSerializer.save on update by the kind of the change, without
+    # the checks of the changed fields (map sheet, department, year), which add
+    # their own. Closing a tracker costs 3 (select, update, rollup), starting one
+    # up to 5 (insert, rollup update or a savepoint guarded rollup insert).
+    # Kept by test_task_update_query_budget.
+    UPDATE_QUERY_BUDGET = {
+        # savepoint, task update, log comment, release
+        "fields": 4,
+        # + tracker closed and started
+        "user": 12,
+        # the same, the active task of the user is kept by a constraint
+        "progress": 12,
+        # + last user of the work status
+        "queue": 13,
+        # + tracker closed
+        "done": 7,
+        # + last user of the work status, tracker started
+        "reopen": 10,
+    }
+
+    def _update(self, task_transition, map_sheet, comment_data, **kwargs):
+        """
+        Apply the update to the task with one write: the tracker in progress is
+        closed and a new one started when the status or the user changes.
+        """
+        task = self.instance
+        validated_data = {**self.validated_data, **kwargs}
+        changes_status = bool(task_transition and task_transition.changes_status)
+        changes_user = bool(validated_data.get("user") and not validated_data.get("status"))
+        restarts_tracker = changes_status or changes_user
+        # The closed tracker ends when the next one starts
+        time_now = datetime.now()
+
+        if restarts_tracker and not task_transition.reopens:
+            time_tracker = task.task_time_trackers.get_or_none(
+                status=TimeTrackerStatuses.IN_PROGRESS
+            )
+            if time_tracker:
+                time_tracker.change_status_done(end_time=time_now)
+
+        for attr, value in validated_data.items():
+            setattr(task, attr, value)
         if map_sheet:
-            self.instance.map_sheet = map_sheet
+            task.map_sheet = map_sheet
+        if changes_status:
+            if task_transition.reopens:
+                task.done = None
+            if task_transition.queue_work_status and "user" not in validated_data:
+                task.user_id = task.last_user_id(task_transition.queue_work_status)
+            if task_transition.finishes:
+                task.done = time_now
+                task.user = None
+        task.save()
+
+        if restarts_tracker and task.status != Statuses.DONE.value:
+            task.start_time_tracker(start_time=time_now)
+        task.create_log_comment(**comment_data)
+        return task
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Related field resolved from the objects loaded by the list serializer
+    for the whole batch, so items are validated without queries.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return self.context["related_objects"][self.queryset.model][int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class TaskBulkCreateListSerializer(serializers.ListSerializer):
+    """
+    Validates a list of new tasks with one query per related model and creates
+    map sheets, tasks, their first time trackers and log comments by bulk inserts
+    in one transaction.
+    """
+
+    RELATED_FIELDS = {"department": Department, "user": User}
+
+    def load_related_objects(self, data):
+        ids = {field: set() for field in self.RELATED_FIELDS}
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            for field in self.RELATED_FIELDS:
+                try:
+                    ids[field].add(int(item.get(field)))
+                except (TypeError, ValueError):
+                    pass
+        return {
+            model: model.objects.in_bulk(ids[field])
+            for field, model in self.RELATED_FIELDS.items()
+        }
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.context["related_objects"] = self.load_related_objects(data)
+        return self.check_names(super().to_internal_value(data))
+
+    @staticmethod
+    def check_names(attrs):
+        """Names repeated for the same year in the list."""
+        errors = [{} for _ in attrs]
+        seen = set()
+        for index, item in enumerate(attrs):
+            key = (item["name"], item.get("year"))
+            if key in seen:
+                errors[index] = {"name": [f"Задача {item['name']} повторюється у списку."]}
+            seen.add(key)
+        if any(errors):
+            raise ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        request_user = self.context["request"].user
+        time_now = datetime.now()
+        with transaction.atomic():
+            map_sheets = MapSheet.objects.bulk_create(
+                [item.pop("map_sheet") for item in validated_data]
+            )
+            tasks = Task.objects.bulk_create(
+                [
+                    Task(map_sheet=map_sheet, **item)
+                    for map_sheet, item in zip(map_sheets, validated_data)
+                ]
+            )
+            TimeTracker.objects.bulk_create(
+                [
+                    TimeTracker(
+                        task=task,
+                        user=task.user,
+                        start_time=time_now,
+                        task_status=task.status,
+                        task_department_id=task.department_id,
+                    )
+                    for task in tasks
+                ]
+            )
+            TaskTimeRollup.objects.bulk_create(
+                [
+                    TaskTimeRollup(task=task, task_status=task.status, trackers_count=1)
+                    for task in tasks
+                ]
+            )
+            Comment.objects.bulk_create(
+                [
+                    Comment(
+                        task=task,
+                        user=request_user,
+                        body=f"Створено задачу для {task.name}",
+                        is_log=True,
+                    )
+                    for task in tasks
+                ]
+            )
+        TimeTracker.invalidate_timesheets({task.user_id for task in tasks})
+        for task in tasks:
+            publish_board_event(task.department_id, "task_created", task.get_event_data())
+        return tasks
+
+
+class TaskBulkCreateSerializer(serializers.ModelSerializer):
+    """
+    One task of tasks/bulk, checked by the same rules as a task created by TaskSerializer.
+    """
 
-        time_tracker = self.instance.task_time_trackers.get_or_none(
-            task__id=self.instance.id, status=TimeTrackerStatuses.IN_PROGRESS
+    department = BulkPrimaryKeyRelatedField(queryset=Department.objects.all())
+    user = BulkPrimaryKeyRelatedField(
+        queryset=User.objects.all(), default=None, allow_null=True
+    )
+
+    class Meta:
+        model = Task
+        fields = [
+            "name",
+            "editing_time_estimate",
+            "correcting_time_estimate",
+            "tc_time_estimate",
+            "scale",
+            "quarter",
+            "year",
+            "category",
+            "user",
+            "department",
+        ]
+        extra_kwargs = {"quarter": {"required": True}}
+        list_serializer_class = TaskBulkCreateListSerializer
+
+    def validate(self, attrs):
+        department = attrs["department"]
+        user = attrs.get("user")
+        if department.is_verifier:
+            raise ValidationError(
+                {"department": "Задача не може належати перевіряючему відділу."}
+            )
+        if user and user.department_id != department.id:
+            raise ValidationError(
+                {
+                    "department": "Виконавцем можна призначити тільки користувача з відділу для якого створено задачу"
+                }
+            )
+        if year := attrs.get("year"):
+            try:
+                Task.check_year_is_correct(year=year)
+            except AssertionError as error:
+                raise ValidationError(error.args[0])
+        try:
+            Task.check_name_correspond_to_scale_rule(
+                attrs["name"], attrs.get("scale", TaskScales.FIFTY.value)
+            )
+        except ValidationError as error:
+            raise ValidationError(
+                error.detail if isinstance(error.detail, dict) else {"name": error.detail}
+            )
+
+        map_sheet = MapSheetSerializer(
+            data={
+                field: attrs[field]
+                for field in TaskSerializer.MAP_SHEET_REQUIRED_FIELDS
+                if field in attrs
+            }
         )
-        if validated_status := self.validated_data.get("status"):
+        if not map_sheet.is_valid():
+            raise ValidationError({"map_sheet": map_sheet.errors})
+        attrs["map_sheet"] = map_sheet.build()
+        return attrs
+
+
+class TaskBulkTransitionSerializer(serializers.Serializer):
+    """
+    Status and/or user change of many tasks for tasks/bulk_transition.
+    Workflow rules are looked up for every task, time trackers, tasks and log
+    comments are written by bulk statements in one transaction. Nothing is
+    changed when any task breaks a rule.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.TASKS_BULK_MAX_LENGTH,
+    )
+    status = serializers.ChoiceField(choices=Statuses.choices, required=False, label="Статус")
+    user = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.select_related("department"),
+        required=False,
+        allow_null=True,
+        label="Відповідальний",
+    )
+
+    def validate(self, attrs):
+        if "status" not in attrs and "user" not in attrs:
+            raise ValidationError(
+                {"status": "Потрібно вказати новий статус або відповідального користувача."}
+            )
+        attrs["ids"] = list(dict.fromkeys(attrs["ids"]))
+        return attrs
+
+    def _task_errors(self, tasks):
+        request_user = self.context["request"].user
+        status = self.validated_data.get("status")
+        user_given = "user" in self.validated_data
+        new_user = self.validated_data.get("user")
+
+        errors = defaultdict(list)
+        progress_users = defaultdict(list)
+        for task in tasks:
+            try:
+                task_transition = transition(request_user, task, status=status, user=new_user)
+            except ValidationError as error:
+                errors[task.id].extend(error.detail.values())
+                continue
+            user = new_user if user_given else task.user
             if (
-                self.instance.status == Statuses.DONE.value
-                and validated_status != Statuses.DONE.value
-                and (
-                    self.context.get("request").user.is_admin
-                    or self.context.get("request").user.id
-                    == self.instance.department.head.id
-                )
+                user
+                and user.department_id != task.department_id
+                and is_department_bound(user.role, task_transition.to_status)
             ):
-                self.instance.done = None
-                if "user" not in self.validated_data:
-                    self.instance.update_user_in_queue_status(status=validated_status)
-                super().save(**kwargs)
-                self.instance.start_time_tracker()
-                self.instance.create_log_comment(**comment_data)
-                return self.instance
-
-            if validated_status != time_tracker.task_status:
-                self._check_user_for_progress_status()
-                time_tracker.change_status_done()
-                super().save(**kwargs)
-                if validated_status != Statuses.DONE.value:
-                    if "user" not in self.validated_data:
-                        self.instance.update_user_in_queue_status(
-                            status=validated_status
+                errors[task.id].append(
+                    "Виконавцем можна призначити тільки користувача з відділу для якого створено задачу"
+                )
+            if user and task_transition.to_status in PROGRESS_STATUSES:
+                progress_users[user].append(task)
+
+        busy_tasks = dict(
+            Task.objects.filter(
+                user__in=progress_users, status__in=PROGRESS_STATUSES
+            )
+            .exclude(id__in=[task.id for task in tasks])
+            .values_list("user_id", "name")
+        )
+        for user, user_tasks in progress_users.items():
+            busy_task = busy_tasks.get(user.id) or (user_tasks[0].name if len(user_tasks) > 1 else None)
+            if busy_task:
+                for task in user_tasks:
+                    errors[task.id].append(
+                        f"У користувача {user.username} вже є активна задача {busy_task}"
+                    )
+        return errors
+
+    def _log_text(self):
+        change_list = []
+        for key, value in self.validated_data.items():
+            if key == "ids":
+                continue
+            if key == "user" and value:
+                value = f"{value.last_name} {value.first_name}"
+            change_list.append(f"{self.fields[key].label} - {value}")
+        return f'Внесено зміни: {", ".join(change_list)}'
+
+    def save(self):
+        request_user = self.context["request"].user
+        ids = self.validated_data["ids"]
+        status = self.validated_data.get("status")
+        user_given = "user" in self.validated_data
+        new_user = self.validated_data.get("user")
+        time_now = datetime.now()
+
+        with transaction.atomic():
+            tasks = list(
+                Task.objects.select_for_update(of=("self",))
+                .filter(id__in=ids)
+                .select_related("department", "user")
+            )
+            if missing := set(ids) - {task.id for task in tasks}:
+                raise ValidationError(
+                    {"ids": f"Задачі {', '.join(map(str, sorted(missing)))} не знайдено."}
+                )
+            if errors := self._task_errors(tasks):
+                raise ValidationError({"ids": errors})
+
+            tasks = [
+                task
+                for task in tasks
+                if (status and status != task.status) or (user_given and new_user != task.user)
+            ]
+            task_ids = [task.id for task in tasks]
+            transitions = {
+                task.id: transition(request_user, task, status=status, user=new_user)
+                for task in tasks
+            }
+            # As in TaskSerializer._update, trackers are restarted when the status
+            # changes or only the user is given
+            restarted_ids = {
+                task.id
+                for task in tasks
+                if transitions[task.id].changes_status or (new_user and not status)
+            }
+
+            closed_trackers = list(
+                TimeTracker.objects.filter(
+                    task_id__in=restarted_ids, status=TimeTrackerStatuses.IN_PROGRESS
+                )
+            )
+            rollup_changes = []
+            for tracker in closed_trackers:
+                hours = (
+                    business_calendar.hours(tracker.start_time, time_now)
+                    if tracker.start_time
+                    else tracker.hours
+                )
+                rollup_changes.append(
+                    (tracker.task_id, tracker.task_status, hours - tracker.hours, 0, time_now)
+                )
+                tracker.end_time = time_now
+                tracker.status = TimeTrackerStatuses.DONE
+                tracker.hours = hours
+                tracker.updated = time_now
+                tracker.version += 1
+            TimeTracker.objects.bulk_update(
+                closed_trackers, ["end_time", "status", "hours", "updated", "version"]
+            )
+
+            queue_users = {}
+            if status in QUEUE_WORK_STATUSES and not user_given:
+                for task_id, user_id in (
+                    TimeTracker.objects.filter(
+                        task_id__in=task_ids, task_status=QUEUE_WORK_STATUSES[status]
+                    )
+                    .order_by("id")
+                    .values_list("task_id", "user_id")
+                ):
+                    queue_users[task_id] = user_id
+
+            for task in tasks:
+                task_transition = transitions[task.id]
+                if status:
+                    task.status = status
+                if user_given:
+                    task.user = new_user
+                elif task_transition.queue_work_status:
+                    task.user_id = queue_users.get(task.id)
+                if task_transition.reopens:
+                    task.done = None
+                if task_transition.finishes:
+                    task.done = time_now
+                    task.user = None
+                task.updated = time_now
+                task.version += 1
+            try:
+                Task.objects.bulk_update(tasks, ["status", "user", "done", "updated", "version"])
+                started_trackers = TimeTracker.objects.bulk_create(
+                    [
+                        TimeTracker(
+                            task=task,
+                            user_id=task.user_id,
+                            start_time=time_now,
+                            task_status=task.status,
+                            task_department_id=task.department_id,
                         )
-                    self.instance.start_time_tracker()
-                else:
-                    self.instance.done = datetime.now()
-                    self.instance.user = None
-                    super().save(**kwargs)
-                self.instance.create_log_comment(**comment_data)
-                return self.instance
-        if validated_user := self.validated_data.get("user") and not validated_status:
-            self._check_user_for_progress_status()
-            time_tracker.change_status_done()
-            super().save(**kwargs)
-            self.instance.start_time_tracker()
-            self.instance.create_log_comment(**comment_data)
-            return self.instance
+                        for task in tasks
+                        if task.id in restarted_ids and task.status != Statuses.DONE.value
+                    ]
+                )
+            except IntegrityError:
+                # A user task or a tracker went in progress by a concurrent request after the checks
+                raise ValidationError(
+                    {"ids": "Задачі змінено іншим запитом, оновіть дані та повторіть спробу."}
+                )
+            rollup_changes.extend(
+                (tracker.task_id, tracker.task_status, 0, 1, None)
+                for tracker in started_trackers
+            )
+            TaskTimeRollup.add_many(rollup_changes)
+
+            log_text = self._log_text()
+            Comment.objects.bulk_create(
+                [
+                    Comment(task=task, user=request_user, body=log_text, is_log=True)
+                    for task in tasks
+                ]
+            )
+        TimeTracker.invalidate_timesheets(
+            {tracker.user_id for tracker in [*closed_trackers, *started_trackers]}
+        )
+        for task in tasks:
+            publish_board_event(task.department_id, "task_updated", task.get_event_data())
+        return tasks
+
+
+class TaskNormalizedSerializer(TaskSerializer):
+    """
+    Task with related users and departments as ids, for the normalized task list.
+    """
+    involved_users = serializers.SerializerMethodField()
+
+    class Meta(TaskSerializer.Meta):
+        fields = [
+            field
+            for field in TaskSerializer.Meta.fields
+            if field not in ["user_obj", "department_obj"]
+        ]
 
-        super().save(**kwargs)
-        self.instance.create_log_comment(**comment_data)
-        return self.instance
+    def get_involved_users(self, task):
+        return [user.id for user in task.involved_users]
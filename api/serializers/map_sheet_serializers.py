@@ -85,3 +85,7 @@ class MapSheetSerializer(serializers.ModelSerializer):
     def save(self, **kwargs):
         updated_kwargs = {**kwargs, **self._get_map_sheet_data()}
         return super().save(**updated_kwargs)
+
+    def build(self):
+        """Unsaved map sheet from the validated data, for bulk_create."""
+        return MapSheet(**{**self.validated_data, **self._get_map_sheet_data()})
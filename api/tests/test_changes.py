@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+from rest_framework.reverse import reverse
+
+from api.models import Statuses, TimeTracker
+from api.choices import UserRoles
+from api.utils import update_time_trackers_hours
+from conftest import create_user_with_department, create_task, default_user_data
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-05 09:00:00")
+def test_changes_since_token(api_client, super_user, freezer):
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task_1 = create_task(department=department, name="M-36-23-B")
+    task_2 = create_task(department=department, name="M-36-101-A")
+
+    api_client.force_authenticate(super_user)
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(minutes=1))
+
+    # Initial sync returns only the token, the state is read from the paginated lists
+    changes = api_client.get(reverse("changes"))
+    assert changes.data.get("success")
+    snapshot = changes.data.get("data")[0]
+    assert not snapshot.get("tasks")
+    assert not snapshot.get("time_trackers")
+    token = snapshot.get("token")
+    assert api_client.get(reverse("task-list")).data.get("data_len") == 2
+
+    # Nothing changed since the token
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(minutes=1))
+    changes = api_client.get(reverse("changes"), {"since": token})
+    snapshot = changes.data.get("data")[0]
+    assert not snapshot.get("tasks")
+    assert not snapshot.get("time_trackers")
+    assert not snapshot.get("comments")
+
+    # Task status is changed and the other task is deleted
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=1))
+    api_client.patch(
+        reverse("task-detail", kwargs={"pk": task_1.id}),
+        data={"user": user.id, "status": Statuses.EDITING.value},
+        format="json",
+    )
+    api_client.delete(reverse("task-detail", kwargs={"pk": task_2.id}))
+
+    changes = api_client.get(reverse("changes"), {"since": token})
+    snapshot = changes.data.get("data")[0]
+    assert [task.get("id") for task in snapshot.get("tasks")] == [task_1.id]
+    assert len(snapshot.get("time_trackers")) == 2
+    assert len(snapshot.get("comments")) == 1
+    assert snapshot.get("deleted").get("tasks") == [task_2.id]
+
+    # Time done of a task is changed by its time trackers only
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=1))
+    token = snapshot.get("token")
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=1))
+    update_time_trackers_hours()
+    changes = api_client.get(reverse("changes"), {"since": token})
+    snapshot = changes.data.get("data")[0]
+    assert [task.get("id") for task in snapshot.get("tasks")] == [task_1.id]
+    assert snapshot.get("tasks")[0].get("editing_time_done") == 2
+
+    # Rows saved just before the token are sent again
+    token = snapshot.get("token")
+    TimeTracker.objects.filter(task=task_1).update(
+        updated=datetime.datetime.now() - datetime.timedelta(seconds=1)
+    )
+    changes = api_client.get(reverse("changes"), {"since": token})
+    assert len(changes.data.get("data")[0].get("time_trackers")) == 2
+
+    # Invalid token
+    changes = api_client.get(reverse("changes"), {"since": "yesterday"})
+    assert not changes.data.get("success")
+    assert changes.data.get("errors")[0].get("attr") == "since"
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import pytest
+from django.test import Client
+from rest_framework.reverse import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.events import InProcessBroker
+from api.models import Statuses
+from api.choices import UserRoles
+from conftest import create_user_with_department, create_task, default_user_data
+
+
+@pytest.mark.django_db
+def test_in_process_broker_delivers_events_from_other_threads():
+
+    broker = InProcessBroker()
+
+    async def receive():
+        subscription = broker.subscribe(1)
+        other_subscription = broker.subscribe(2)
+        publisher = threading.Thread(
+            target=broker.publish, args=(1, {"type": "task_updated", "data": {"id": 1}})
+        )
+        publisher.start()
+        event = await asyncio.wait_for(subscription.get(), timeout=1)
+        publisher.join()
+        await subscription.close()
+        await other_subscription.close()
+        return event, other_subscription.queue.empty()
+
+    event, other_department_is_empty = asyncio.run(receive())
+
+    assert event == {"type": "task_updated", "data": {"id": 1}}
+    assert other_department_is_empty
+    assert not any(broker._subscriptions.values())
+
+
+@pytest.mark.django_db
+def test_task_changes_publish_board_events(
+    api_client, super_user, monkeypatch, django_capture_on_commit_callbacks
+):
+
+    published = []
+    monkeypatch.setattr(
+        InProcessBroker, "publish", lambda self, department_id, event: published.append((department_id, event))
+    )
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task = create_task(department=department)
+
+    api_client.force_authenticate(super_user)
+    with django_capture_on_commit_callbacks(execute=True):
+        result = api_client.patch(
+            reverse("task-detail", kwargs={"pk": task.id}),
+            data={"user": user.id, "status": Statuses.EDITING.value},
+            format="json",
+        )
+    assert result.data.get("success")
+
+    assert [event.get("type") for department_id, event in published] == [
+        "tracker_stopped",
+        "tracker_started",
+        "comment_created",
+        "task_updated",
+    ]
+    assert all(department_id == department.id for department_id, event in published)
+    assert published[-1][1].get("data").get("status") == Statuses.EDITING.value
+
+
+@pytest.mark.django_db
+def test_board_events_access(super_user):
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    other_department_url = reverse("board-events", kwargs={"department_id": department.id + 1})
+
+    response = Client().get(other_department_url)
+    assert response.status_code == 401
+
+    response = Client().get(f"{other_department_url}?ticket=wrong")
+    assert response.status_code == 401
+
+    token = RefreshToken.for_user(user).access_token
+    response = Client().get(other_department_url, HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert response.status_code == 403
+
+    # Access tokens are not accepted in the URL, tickets are used once
+    response = Client().get(f"{other_department_url}?token={token}")
+    assert response.status_code == 401
+    response = Client().post(reverse("board-events-ticket"), HTTP_AUTHORIZATION=f"Bearer {token}")
+    ticket = response.json()["data"][0]["ticket"]
+    response = Client().get(f"{other_department_url}?ticket={ticket}")
+    assert response.status_code == 403
+    response = Client().get(f"{other_department_url}?ticket={ticket}")
+    assert response.status_code == 401
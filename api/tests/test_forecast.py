@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+from rest_framework.reverse import reverse
+
+from api.choices import UserRoles
+from api.models import Statuses, Task, TaskForecast, TaskTimeRollup, TimeTracker
+from conftest import create_user_with_department, create_task, default_user_data
+from kanban.settings import business_calendar
+from kanban.tasks import refresh_task_forecasts
+
+
+@pytest.mark.django_db
+def test_business_calendar_add_working_seconds():
+
+    """
+    TestCase:
+    1) Working time is added over lunch breaks, weekends and holidays.
+    2) Working seconds between the start and the result are the added seconds.
+    """
+
+    friday = datetime.datetime(2023, 6, 9, 12)
+    assert business_calendar.add_working_seconds(friday, 0) == friday
+    assert business_calendar.add_working_seconds(friday, 3 * 3600) == friday.replace(hour=16)
+    assert business_calendar.add_working_seconds(friday, 6 * 3600) == datetime.datetime(2023, 6, 12, 10)
+    saturday = datetime.datetime(2023, 6, 10, 12)
+    assert business_calendar.add_working_seconds(saturday, 0) == datetime.datetime(2023, 6, 12, 9)
+    for hours in [1, 7, 40, 1000, 30000]:
+        eta = business_calendar.add_working_seconds(friday, hours * 3600)
+        assert business_calendar.working_seconds(friday, eta) == hours * 3600
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-09 12:00:00")
+def test_refresh_task_forecasts(api_client, settings):
+
+    """
+    TestCase:
+    1) Remaining hours are medians of done tasks per status minus hours spent in the current status.
+    2) Statuses without enough history fall back to the estimate of the task.
+    3) ETA is shown in the task list, done tasks have no forecast.
+    """
+
+    settings.TASK_FORECAST_MIN_SAMPLES = 2
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    history = [
+        create_task(user=user, department=department, name=f"M-34-00{number}-A")
+        for number in range(1, 4)
+    ]
+    task_open = create_task(user=user, department=department, name="M-34-010-A")
+    for tracker in TimeTracker.objects.all():
+        tracker.delete()
+    Task.objects.filter(id__in=[task.id for task in history]).update(
+        status=Statuses.DONE.value
+    )
+    for task, editing_hours, tc_hours in zip(history, [10, 15, 40], [4, 5, 6]):
+        TaskTimeRollup.add(task.id, Statuses.EDITING.value, hours=editing_hours, trackers_count=1)
+        TaskTimeRollup.add(task.id, Statuses.TC.value, hours=tc_hours, trackers_count=1)
+    Task.objects.filter(id=task_open.id).update(status=Statuses.EDITING.value)
+    TaskTimeRollup.add(task_open.id, Statuses.EDITING.value, hours=5, trackers_count=1)
+
+    refresh_task_forecasts()
+
+    assert TaskForecast.objects.count() == 1
+    forecast = TaskForecast.objects.get(task=task_open)
+    # 15 - 5 of editing, correcting estimate 25, 5 of tc, queues have no history
+    assert forecast.remaining_hours == 10 + 25 + 5
+    eta = business_calendar.add_working_seconds(datetime.datetime(2023, 6, 9, 12), 40 * 3600)
+    assert forecast.eta == eta
+
+    api_client.force_authenticate(user)
+    result = api_client.get(reverse("task-list"))
+    assert result.status_code == 200
+    etas = {task["id"]: task["eta"] for task in result.data["data"]}
+    assert etas[task_open.id] == eta.strftime("%d-%m-%Y %H:%M")
+    assert etas[history[0].id] is None
+
+    Task.objects.filter(id=task_open.id).update(status=Statuses.DONE.value)
+    refresh_task_forecasts()
+    assert not TaskForecast.objects.exists()
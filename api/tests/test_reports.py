@@ -0,0 +1,209 @@
+import datetime
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.reverse import reverse
+
+from api.models import Statuses, Task, TimeTracker, Department
+from api.choices import UserRoles, TimeTrackerStatuses
+from conftest import create_user_with_department, create_task, default_user_data
+from kanban.settings import business_calendar
+from kanban.tasks import refresh_flow_reports
+
+
+def create_tracker(task, start_time, end_time, task_status):
+    return TimeTracker.objects.create(
+        task=task,
+        user=task.user,
+        start_time=start_time,
+        end_time=end_time,
+        status=TimeTrackerStatuses.DONE if end_time else TimeTrackerStatuses.IN_PROGRESS,
+        task_status=task_status,
+        task_department=task.department,
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-09 12:00:00")
+def test_flow_report(api_client, super_user):
+
+    """
+    TestCase:
+    1) Cumulative flow counts tasks in every status at the end of each day.
+    2) Lead and cycle times are working hours to done, grouped by department, scale and quarter.
+    3) Report is cached and refreshed by the nightly task.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task_done = create_task(user=user, department=department, name="M-34-001-A")
+    task_open = create_task(user=user, department=department, name="M-34-002-A")
+    for tracker in TimeTracker.objects.all():
+        tracker.delete()
+
+    monday = datetime.datetime(2023, 6, 5)
+    create_tracker(task_done, monday.replace(hour=9), monday.replace(hour=11), Statuses.EDITING_QUEUE.value)
+    create_tracker(
+        task_done, monday.replace(hour=11), datetime.datetime(2023, 6, 6, 15), Statuses.EDITING.value
+    )
+    Task.objects.filter(id=task_done.id).update(
+        status=Statuses.DONE.value, done=datetime.datetime(2023, 6, 6, 15)
+    )
+    create_tracker(task_open, monday.replace(hour=9), None, Statuses.EDITING_QUEUE.value)
+    task_done_before = create_task(user=user, department=department, name="M-34-003-A")
+    TimeTracker.objects.filter(task=task_done_before).delete()
+    create_tracker(
+        task_done_before, datetime.datetime(2023, 5, 1, 9), datetime.datetime(2023, 5, 2, 9), Statuses.EDITING.value
+    )
+    Task.objects.filter(id=task_done_before.id).update(
+        status=Statuses.DONE.value, done=datetime.datetime(2023, 5, 2, 9)
+    )
+
+    api_client.force_authenticate(user)
+    url = f'{reverse("report-flow")}?from=2023-06-05&to=2023-06-09'
+    result = api_client.get(url)
+    assert result.status_code == 200
+    report = result.data.get("data")[0]
+    assert report["days"][0] == "2023-06-05"
+    assert report["cumulative_flow"][Statuses.EDITING_QUEUE.value] == [1, 1, 1, 1, 1]
+    assert report["cumulative_flow"][Statuses.EDITING.value] == [1, 0, 0, 0, 0]
+    # The task done in May starts the done band
+    assert report["cumulative_flow"][Statuses.DONE.value] == [1, 2, 2, 2, 2]
+    lead_time = report["lead_time"][0]
+    assert (lead_time["department"], lead_time["scale"], lead_time["quarter"]) == (
+        department.id, task_done.scale, task_done.quarter
+    )
+    assert lead_time["count"] == 1
+    assert lead_time["p50"] == 13
+    assert report["cycle_time"][0]["max"] == 11
+
+    with CaptureQueriesContext(connection) as queries:
+        api_client.get(url)
+    assert not [query for query in queries if "api_timetracker" in query["sql"]]
+
+    result = api_client.get(f'{reverse("report-flow")}?department={department.id}')
+    report = result.data.get("data")[0]
+    assert len(report["days"]) == 30
+    assert report["days"][-1] == "2023-06-09"
+    assert report["cumulative_flow"][Statuses.DONE.value][-1] == 2
+
+    result = api_client.get(f'{reverse("report-flow")}?from=2023-06-09&to=2023-06-05')
+    assert result.status_code == 400
+
+    refresh_flow_reports()
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-09 12:00:00")
+def test_capacity_report(api_client):
+
+    """
+    TestCase:
+    1) Remaining estimate is the estimate minus hours done in the work status of the role.
+    2) Available hours are working hours left in the quarter times users with the role.
+    3) Report is built with a fixed number of queries.
+    """
+
+    user_data = default_user_data(3, roles=[UserRoles.EDITOR.value] * 2 + [UserRoles.CORRECTOR.value])
+    editor, department = create_user_with_department(next(user_data))
+    create_user_with_department(next(user_data))
+    create_user_with_department(next(user_data))
+    task_current = create_task(user=editor, department=department, name="M-34-001-A")
+    task_next = create_task(user=editor, department=department, name="M-34-002-A")
+    task_done = create_task(user=editor, department=department, name="M-34-003-A")
+    Task.objects.filter(id=task_current.id).update(year=2023, quarter=2)
+    Task.objects.filter(id=task_next.id).update(year=2023, quarter=3)
+    Task.objects.filter(id=task_done.id).update(year=2023, quarter=3, status=Statuses.DONE.value)
+    for tracker in TimeTracker.objects.all():
+        tracker.delete()
+    # 24 working hours of editing
+    create_tracker(
+        task_current,
+        datetime.datetime(2023, 6, 5, 9),
+        datetime.datetime(2023, 6, 7, 18),
+        Statuses.EDITING.value,
+    )
+
+    api_client.force_authenticate(editor)
+    with CaptureQueriesContext(connection) as queries:
+        result = api_client.get(f'{reverse("report-capacity")}?year=2023')
+    assert result.status_code == 200
+    assert len(queries) == 3
+    rows = {
+        (row["quarter"], row["role"]): row for row in result.data.get("data")[0]["rows"]
+    }
+    assert len(rows) == 6
+
+    editors_q2 = rows[(2, UserRoles.EDITOR.value)]
+    left_in_q2 = business_calendar.working_seconds(
+        datetime.datetime(2023, 6, 9, 12), datetime.datetime(2023, 7, 1)
+    ) / 3600
+    assert editors_q2["remaining_hours"] == 50 - 24
+    assert editors_q2["users"] == 2
+    assert editors_q2["available_hours"] == round(2 * left_in_q2, 1)
+    assert rows[(2, UserRoles.CORRECTOR.value)]["remaining_hours"] == 25
+
+    verifiers_q3 = rows[(3, UserRoles.VERIFIER.value)]
+    assert verifiers_q3["remaining_hours"] == 15
+    assert verifiers_q3["users"] == 0
+    assert verifiers_q3["available_hours"] == 0
+    assert verifiers_q3["load"] is None
+    correctors_q3 = rows[(3, UserRoles.CORRECTOR.value)]
+    q3_hours = business_calendar.working_seconds(
+        datetime.datetime(2023, 7, 1), datetime.datetime(2023, 10, 1)
+    ) / 3600
+    assert correctors_q3["available_hours"] == round(q3_hours, 1)
+    assert correctors_q3["load"] == round(25 / round(q3_hours, 1), 2)
+
+    result = api_client.get(f'{reverse("report-capacity")}?year=2023&department=999')
+    assert result.status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-09 12:00:00")
+def test_capacity_report_verifiers(api_client):
+
+    """
+    TestCase:
+    1) Technical control estimates of all departments are compared with verifiers of verifier departments.
+    2) Verifiers outside verifier departments and other users of verifier departments are not counted.
+    3) With a department, its estimates are compared with the same verifiers.
+    """
+
+    user_data = default_user_data(
+        6,
+        roles=[UserRoles.EDITOR.value] * 2 + [UserRoles.VERIFIER.value] * 3 + [UserRoles.EDITOR.value],
+    )
+    editor, department = create_user_with_department(next(user_data), dep_name="DEP_A")
+    create_user_with_department(next(user_data), dep_name="DEP_B")
+    create_user_with_department(next(user_data), dep_name="DEP_A")
+    for _ in range(3):
+        create_user_with_department(next(user_data), dep_name="ВТК")
+    Department.objects.filter(name="ВТК").update(is_verifier=True)
+    create_task(user=editor, department=department, name="M-34-001-A")
+    create_task(department=Department.objects.get(name="DEP_B"), name="M-34-002-A")
+    Task.objects.update(year=2023, quarter=3)
+    q3_hours = business_calendar.working_seconds(
+        datetime.datetime(2023, 7, 1), datetime.datetime(2023, 10, 1)
+    ) / 3600
+
+    api_client.force_authenticate(editor)
+    with CaptureQueriesContext(connection) as queries:
+        result = api_client.get(f'{reverse("report-capacity")}?year=2023')
+    assert len(queries) == 3
+    verifier_rows = [
+        row for row in result.data.get("data")[0]["rows"] if row["role"] == UserRoles.VERIFIER.value
+    ]
+    assert len(verifier_rows) == 1
+    assert verifier_rows[0]["department"] is None
+    assert verifier_rows[0]["quarter"] == 3
+    assert verifier_rows[0]["remaining_hours"] == 15 * 2
+    assert verifier_rows[0]["users"] == 2
+    assert verifier_rows[0]["available_hours"] == round(2 * q3_hours, 1)
+
+    result = api_client.get(f'{reverse("report-capacity")}?year=2023&department={department.id}')
+    rows = {row["role"]: row for row in result.data.get("data")[0]["rows"]}
+    assert rows[UserRoles.EDITOR.value]["users"] == 1
+    assert rows[UserRoles.VERIFIER.value]["remaining_hours"] == 15
+    assert rows[UserRoles.VERIFIER.value]["users"] == 2
@@ -1,9 +1,11 @@
 import datetime
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.reverse import reverse
 
 from api.CONSTANTS import TASK_NAME_RULES
-from api.models import TimeTracker, Statuses, Department, Task
+from api.models import TimeTracker, Statuses, Department, Task, Comment, TaskTimeRollup
 from api.choices import UserRoles, TimeTrackerStatuses
 from conftest import create_user_with_department, create_task, default_user_data, create_default_user
 from kanban.settings import workday_time, launch_time
@@ -1063,3 +1065,463 @@ def test_create_task_for_is_verifier_department(api_client, super_user):
     assert task.data.get("errors")[0].get("attr") == "department"
 
 
+
+
+@pytest.mark.django_db
+def test_task_list_queries_do_not_depend_on_page_size(api_client, super_user):
+
+    """
+    TestCase:
+    1) Task list with nested users, departments and time trackers is loaded
+       with the same number of queries for 2 and for 6 tasks.
+    """
+
+    users_data = default_user_data(6, roles=[UserRoles.EDITOR.value] * 6)
+    users = []
+    for num in range(6):
+        user, department = create_user_with_department(next(users_data), dep_name=f"Dep_{num}")
+        department.head = user
+        department.save()
+        users.append((user, department))
+
+    def create_tasks(users_slice):
+        for user, department in users_slice:
+            task = create_task(user=user, department=department, name="M-37-103-А")
+            TimeTracker.objects.create(
+                task=task,
+                user=user,
+                task_status=Statuses.EDITING.value,
+                task_department=department,
+                status=TimeTrackerStatuses.DONE,
+            )
+
+    api_client.force_authenticate(super_user)
+
+    create_tasks(users[:2])
+    with CaptureQueriesContext(connection) as two_tasks_queries:
+        tasks = api_client.get(reverse("task-list"))
+    assert tasks.data.get("data_len") == 2
+
+    create_tasks(users[2:])
+    with CaptureQueriesContext(connection) as six_tasks_queries:
+        tasks = api_client.get(reverse("task-list"))
+    assert tasks.data.get("data_len") == 6
+
+    assert len(two_tasks_queries) == len(six_tasks_queries)
+    for task in tasks.data.get("data"):
+        assert [user.get("id") for user in task.get("involved_users")] == [task.get("user")]
+        assert task.get("user_obj").get("is_head_department")
+
+
+@pytest.mark.django_db
+def test_task_list_cursor_pagination(api_client, super_user):
+
+    """
+    TestCase:
+    1) Without pagination params all tasks are returned.
+    2) With ?pagination=cursor tasks are returned page by page following next and previous links.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task_ids = [create_task(department=department).id for _ in range(5)]
+
+    api_client.force_authenticate(super_user)
+
+    all_tasks = api_client.get(reverse("task-list"))
+    assert all_tasks.data.get("data_len") == 5
+    assert "next" not in all_tasks.data
+
+    page = api_client.get(f'{reverse("task-list")}?pagination=cursor&page_size=2')
+    pages = [page]
+    while page.data.get("next"):
+        page = api_client.get(page.data.get("next"))
+        pages.append(page)
+
+    assert [page.data.get("data_len") for page in pages] == [2, 2, 1]
+    assert [task.get("id") for page in pages for task in page.data.get("data")] == task_ids
+    assert pages[0].data.get("previous") is None
+
+    previous_page = api_client.get(pages[-1].data.get("previous"))
+    assert previous_page.data.get("success")
+    assert [task.get("id") for task in previous_page.data.get("data")] == task_ids[2:4]
+
+
+@pytest.mark.django_db
+def test_task_list_sparse_fields_and_expand(api_client, super_user):
+
+    """
+    TestCase:
+    1) ?fields= returns only requested fields, without nested objects and their queries.
+    2) ?expand= adds nested objects to the scalar fields.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    create_task(user=user, department=department)
+    create_task(user=user, department=department)
+
+    api_client.force_authenticate(super_user)
+
+    with CaptureQueriesContext(connection) as queries:
+        tasks = api_client.get(f'{reverse("task-list")}?fields=id,name,status')
+    assert tasks.data.get("data_len") == 2
+    assert set(tasks.data.get("data")[0].keys()) == {"id", "name", "status"}
+    assert len(queries) == 1
+    assert "api_timetracker" not in queries[0]["sql"]
+    assert "api_tasktimerollup" not in queries[0]["sql"]
+
+    with CaptureQueriesContext(connection) as queries:
+        tasks = api_client.get(f'{reverse("task-list")}?expand=user_obj')
+    task = tasks.data.get("data")[0]
+    assert task.get("user_obj").get("department_obj").get("id") == department.id
+    assert "editing_time_done" in task
+    assert "time_trackers" not in task
+    assert "involved_users" not in task
+    assert len(queries) == 1
+
+    with CaptureQueriesContext(connection) as queries:
+        tasks = api_client.get(f'{reverse("task-list")}?fields=id&expand=time_trackers')
+    assert set(tasks.data.get("data")[0].keys()) == {"id", "time_trackers"}
+    assert len(tasks.data.get("data")[0].get("time_trackers")) == 1
+    assert len(queries) == 2
+
+
+@pytest.mark.django_db
+def test_task_list_normalized_format(api_client, super_user):
+
+    """
+    TestCase:
+    1) ?format=normalized returns tasks with ids of users and departments.
+    2) Users and departments are side-loaded once, keyed by id.
+    3) Number of queries does not depend on the number of tasks.
+    """
+
+    user_data = default_user_data(2, roles=[UserRoles.EDITOR.value, UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    user_2, department_2 = create_user_with_department(next(user_data), dep_name="Другий відділ")
+    create_task(user=user, department=department)
+    create_task(user=user, department=department, name="M-34-002-A")
+    task = create_task(user=user_2, department=department, name="M-34-003-A")
+
+    api_client.force_authenticate(super_user)
+
+    with CaptureQueriesContext(connection) as queries:
+        tasks = api_client.get(f'{reverse("task-list")}?format=normalized')
+    assert tasks.status_code == 200
+    assert tasks.data.get("data_len") == 3
+    data = {item["id"]: item for item in tasks.data.get("data")}
+    assert "user_obj" not in data[task.id]
+    assert "department_obj" not in data[task.id]
+    assert data[task.id]["user"] == user_2.id
+    assert data[task.id]["involved_users"] == [user_2.id]
+    assert set(tasks.data.get("users")) == {user.id, user_2.id}
+    assert "department_obj" not in tasks.data.get("users")[user_2.id]
+    assert tasks.data.get("users")[user_2.id]["department"] == department_2.id
+    assert set(tasks.data.get("departments")) == {department.id, department_2.id}
+    assert tasks.data.get("departments")[department_2.id]["name"] == "Другий відділ"
+    # tasks, trackers, users, departments
+    assert len(queries) == 4
+
+    tasks = api_client.get(f'{reverse("task-list")}')
+    assert "users" not in tasks.data
+    assert "user_obj" in tasks.data.get("data")[0]
+
+
+@pytest.mark.django_db
+def test_task_facets(api_client, super_user):
+
+    """
+    TestCase:
+    1) tasks/facets returns counts per status, scale, quarter and department in one query.
+    2) Facets follow TaskFilter params.
+    3) Repeated request with the same filter is served from cache.
+    """
+
+    user_data = default_user_data(2, roles=[UserRoles.EDITOR.value, UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    user_2, department_2 = create_user_with_department(next(user_data), dep_name="Другий відділ")
+    create_task(user=user, department=department)
+    task = create_task(user=user, department=department, name="M-34-002-A")
+    create_task(user=user_2, department=department_2, name="M-34-003-A")
+    Task.objects.filter(id=task.id).update(status=Statuses.EDITING.value, quarter=2)
+
+    api_client.force_authenticate(super_user)
+
+    with CaptureQueriesContext(connection) as queries:
+        facets = api_client.get(reverse("task-facets"))
+    assert facets.status_code == 200
+    assert len([query for query in queries if "api_task" in query["sql"]]) == 1
+    data = facets.data.get("data")[0]
+    assert data["total"] == 3
+    assert data["status"] == {Statuses.EDITING_QUEUE.value: 2, Statuses.EDITING.value: 1}
+    assert data["quarter"] == {1: 2, 2: 1}
+    assert data["department"] == {department.id: 2, department_2.id: 1}
+    assert sum(data["scale"].values()) == 3
+
+    url = f'{reverse("task-facets")}?department__id={department.id}&status__in={Statuses.EDITING.value}'
+    facets = api_client.get(url)
+    data = facets.data.get("data")[0]
+    assert data["total"] == 1
+    assert data["department"] == {department.id: 1}
+
+    create_task(department=department, name="M-34-004-A")
+    Task.objects.filter(name="M-34-004-A").update(status=Statuses.EDITING.value)
+    with CaptureQueriesContext(connection) as queries:
+        facets = api_client.get(
+            f'{reverse("task-facets")}?status__in={Statuses.EDITING.value}&department__id={department.id}&ordering=id'
+        )
+    assert not [query for query in queries if "api_task" in query["sql"]]
+    assert facets.data.get("data")[0]["total"] == 1
+
+
+@pytest.mark.django_db
+def test_task_bulk_create(api_client, super_user):
+
+    """
+    TestCase:
+    1) Invalid items are reported by index and nothing is created.
+    2) Tasks are created with map sheets, first time trackers and log comments
+       by a fixed number of queries.
+    3) Names repeated in the list are rejected, existing names are created again
+       as by a single task create.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    verifier_department = Department.objects.create(name="verifier_department", is_verifier=True)
+
+    def task_data(number, **kwargs):
+        return {
+            "name": f"M-37-{number}-А-а",
+            "scale": 25,
+            "editing_time_estimate": 50,
+            "correcting_time_estimate": 25,
+            "tc_time_estimate": 15,
+            "quarter": 1,
+            "category": 3,
+            "user": user.id,
+            "department": department.id,
+            **kwargs,
+        }
+
+    api_client.force_authenticate(super_user)
+    url = reverse("task-bulk")
+    invalid = [
+        task_data(1),
+        task_data(2, department=verifier_department.id, user=None),
+        task_data(3, department=999),
+        task_data(4, name="М-37-4-А-а"),
+    ]
+    result = api_client.post(url, data=invalid, format="json")
+    assert result.status_code == 400
+    assert [error["attr"].split(".")[:2] for error in result.data["errors"]] == [
+        ["1", "department"],
+        ["2", "department"],
+        ["3", "name"],
+    ]
+    assert not Task.objects.exists()
+
+    result = api_client.post(url, data=[task_data(1), task_data(1)], format="json")
+    assert result.status_code == 400
+    assert [error["attr"] for error in result.data["errors"]] == ["1.name"]
+
+    with CaptureQueriesContext(connection) as queries:
+        result = api_client.post(
+            url, data=[task_data(number) for number in range(1, 21)], format="json"
+        )
+    assert result.status_code == 200
+    assert result.data["data_len"] == 20
+    assert len(queries) <= 12
+    assert Task.objects.count() == 20
+    assert MapSheet.objects.filter(task__isnull=False, row="M", column=37).count() == 20
+    assert TimeTracker.objects.filter(
+        status=TimeTrackerStatuses.IN_PROGRESS,
+        task_status=Statuses.EDITING_QUEUE.value,
+        user=user,
+        start_time__isnull=False,
+    ).count() == 20
+    assert Comment.objects.filter(is_log=True, user=super_user).count() == 20
+    assert not TaskTimeRollup.mismatches()
+
+    result = api_client.post(url, data=[task_data(5)], format="json")
+    assert result.status_code == 200
+    assert Task.objects.filter(name=task_data(5)["name"]).count() == 2
+
+    api_client.force_authenticate(user)
+    result = api_client.post(url, data=[task_data(30)], format="json")
+    assert result.status_code == 403
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-09 12:00:00")
+def test_task_bulk_transition(api_client, super_user):
+
+    """
+    TestCase:
+    1) Admin moves tasks to another status with a new user: trackers are closed
+       and started, log comments written by a fixed number of queries.
+    2) Rules are checked for every task, nothing changes when any task breaks them.
+    3) Done tasks have no user and no tracker in progress.
+    """
+
+    user_data = default_user_data(
+        3, roles=[UserRoles.EDITOR.value, UserRoles.EDITOR.value, UserRoles.VERIFIER.value]
+    )
+    editor, department = create_user_with_department(next(user_data))
+    other_editor, _ = create_user_with_department(next(user_data))
+    verifier, _ = create_user_with_department(next(user_data))
+    tasks = [
+        create_task(user=editor, department=department, name=f"M-34-00{number}-A")
+        for number in range(1, 5)
+    ]
+    for tracker in TimeTracker.objects.all():
+        tracker.start_time = datetime.datetime(2023, 6, 8, 9)
+        tracker.save()
+    ids = [task.id for task in tasks]
+    url = reverse("task-bulk-transition")
+
+    api_client.force_authenticate(editor)
+    result = api_client.post(url, data={"ids": ids, "status": Statuses.DONE.value}, format="json")
+    assert result.status_code == 400
+    assert [error["attr"] for error in result.data["errors"]] == [f"ids.{task_id}" for task_id in ids]
+
+    api_client.force_authenticate(super_user)
+    result = api_client.post(
+        url, data={"ids": ids[:2], "status": Statuses.EDITING.value, "user": other_editor.id}, format="json"
+    )
+    assert result.status_code == 400
+    assert {error["attr"] for error in result.data["errors"]} == {f"ids.{ids[0]}", f"ids.{ids[1]}"}
+    result = api_client.post(url, data={"ids": [*ids, 999], "status": Statuses.TC_QUEUE.value}, format="json")
+    assert result.status_code == 400
+    assert not Task.objects.exclude(status=Statuses.EDITING_QUEUE.value).exists()
+
+    with CaptureQueriesContext(connection) as queries:
+        result = api_client.post(
+            url, data={"ids": ids, "status": Statuses.TC_QUEUE.value, "user": verifier.id}, format="json"
+        )
+    assert result.status_code == 200
+    assert result.data["data_len"] == 4
+    assert len(queries) <= 12
+    assert Task.objects.filter(status=Statuses.TC_QUEUE.value, user=verifier).count() == 4
+    closed_trackers = TimeTracker.objects.filter(
+        task_status=Statuses.EDITING_QUEUE.value, status=TimeTrackerStatuses.DONE
+    )
+    assert [tracker.hours for tracker in closed_trackers] == [11] * 4
+    assert TimeTracker.objects.filter(
+        task_status=Statuses.TC_QUEUE.value, status=TimeTrackerStatuses.IN_PROGRESS, user=verifier
+    ).count() == 4
+    assert Comment.objects.filter(
+        is_log=True, body__startswith="Внесено зміни: Статус - TC_QUEUE, Відповідальний - "
+    ).count() == 4
+    assert not TaskTimeRollup.mismatches()
+
+    result = api_client.post(url, data={"ids": ids, "status": Statuses.DONE.value}, format="json")
+    assert result.status_code == 200
+    assert Task.objects.filter(status=Statuses.DONE.value, user=None, done__isnull=False).count() == 4
+    assert not TimeTracker.objects.filter(status=TimeTrackerStatuses.IN_PROGRESS).exists()
+    assert not TaskTimeRollup.mismatches()
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-09 12:00:00")
+def test_task_bulk_transition_matches_task_update(api_client, super_user):
+
+    """
+    TestCase:
+    1) User change of done tasks keeps their done date and user, no trackers are started.
+    2) Same status with a new user does not restart the tracker, as on task update.
+    """
+
+    user_data = default_user_data(2, roles=[UserRoles.EDITOR.value, UserRoles.EDITOR.value])
+    editor, department = create_user_with_department(next(user_data))
+    other_editor, _ = create_user_with_department(next(user_data))
+    done_tasks = [
+        create_task(department=department, name=f"M-34-00{number}-A") for number in range(1, 3)
+    ]
+    done = datetime.datetime(2023, 6, 5, 12)
+    Task.objects.update(status=Statuses.DONE.value, done=done)
+    TimeTracker.objects.update(
+        status=TimeTrackerStatuses.DONE,
+        start_time=datetime.datetime(2023, 6, 5, 9),
+        end_time=done,
+        hours=3,
+    )
+    task = create_task(user=editor, department=department, name="M-34-003-A")
+    Task.objects.filter(id=task.id).update(status=Statuses.EDITING.value)
+    TimeTracker.objects.filter(task=task).update(
+        task_status=Statuses.EDITING.value, start_time=datetime.datetime(2023, 6, 8, 9)
+    )
+    trackers_count = TimeTracker.objects.count()
+    url = reverse("task-bulk-transition")
+    api_client.force_authenticate(super_user)
+
+    result = api_client.post(
+        url, data={"ids": [task.id for task in done_tasks], "user": editor.id}, format="json"
+    )
+    assert result.status_code == 200
+    assert Task.objects.filter(status=Statuses.DONE.value, user=editor, done=done).count() == 2
+    assert TimeTracker.objects.count() == trackers_count
+
+    tracker = TimeTracker.objects.get(task=task)
+    result = api_client.post(
+        url,
+        data={"ids": [task.id], "status": Statuses.EDITING.value, "user": other_editor.id},
+        format="json",
+    )
+    assert result.status_code == 200
+    assert Task.objects.get(id=task.id).user == other_editor
+    assert TimeTracker.objects.get(status=TimeTrackerStatuses.IN_PROGRESS) == tracker
+    assert TimeTracker.objects.count() == trackers_count
+
+
+@pytest.mark.django_db
+def test_task_update_if_match(api_client, super_user):
+
+    """
+    TestCase:
+    1) Task is returned with its version as ETag.
+    2) Update with the current version in If-Match is saved and returns the next ETag.
+    3) Update with a stale version returns 412 and nothing is changed.
+    4) Time tracker updates are checked the same way.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task = create_task(department=department)
+    api_client.force_authenticate(super_user)
+    url = reverse("task-detail", kwargs={"pk": task.id})
+
+    result = api_client.get(url)
+    assert result["ETag"] == '"1"'
+    assert result.data["data"][0]["version"] == 1
+
+    result = api_client.patch(url, data={"category": 4}, format="json", HTTP_IF_MATCH='"1"')
+    assert result.status_code == 200
+    assert result["ETag"] == '"2"'
+    assert result.data["data"][0]["version"] == 2
+
+    result = api_client.patch(url, data={"category": 5}, format="json", HTTP_IF_MATCH='"1"')
+    assert result.status_code == 412
+    assert result.data["errors"][0]["code"] == "precondition_failed"
+    task.refresh_from_db()
+    assert task.category == 4
+    assert task.version == 2
+
+    result = api_client.patch(
+        url, data={"status": Statuses.EDITING.value, "user": user.id}, format="json", HTTP_IF_MATCH='"2"'
+    )
+    assert result.status_code == 200
+    assert result["ETag"] == '"3"'
+
+    tracker = task.task_time_trackers.get(task_status=Statuses.EDITING.value)
+    tracker_url = reverse("time_tracker-detail", kwargs={"pk": tracker.id})
+    result = api_client.patch(
+        tracker_url, data={"task_status": Statuses.EDITING.value}, format="json", HTTP_IF_MATCH=f'"{tracker.version + 1}"'
+    )
+    assert result.status_code == 412
+    result = api_client.patch(
+        tracker_url, data={"task_status": Statuses.EDITING.value}, format="json", HTTP_IF_MATCH=f'"{tracker.version}"'
+    )
+    assert result.status_code == 200
+    assert result["ETag"] == f'"{tracker.version + 1}"'
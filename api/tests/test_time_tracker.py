@@ -1,11 +1,19 @@
 import datetime
+import threading
+from io import StringIO
 
 import pytest
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.reverse import reverse
 
-from api.models import TimeTracker, Statuses
-from api.choices import TimeTrackerStatuses
-from kanban.tasks import update_task_time_in_progress
+from api.models import TimeTracker, Statuses, TaskTimeRollup, Department, Task, TaskForecast
+from api.choices import TimeTrackerStatuses, UserRoles
+from api.utils import update_time_trackers_hours
+from conftest import create_user_with_department, create_task, default_user_data
+from kanban.business_calendar import BusinessCalendar
+from kanban.tasks import update_task_time_in_progress, refresh_task_forecasts
 
 
 @pytest.mark.django_db
@@ -737,3 +745,519 @@ def test_update_time_trackers_hours(api_client, super_user, freezer):
     assert tt_1_task_2.hours + hours_passed - lunch_time - non_working_hours == tt_1_task_2_updated.hours
 
 
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-05 10:00:00")
+def test_time_rollups_follow_time_trackers(api_client, super_user, freezer):
+
+    api_client.force_authenticate(super_user)
+
+    department = api_client.post(reverse("department-list"), data={"name": "test_department"})
+    department_id = department.data.get("data")[0].get("id")
+    user = api_client.patch(
+        reverse("account-detail", kwargs={"pk": super_user.id}),
+        data={"department": department_id},
+    )
+    task_data = {
+        "name": "M-37-103-А",
+        "scale": "50",
+        "editing_time_estimate": 50,
+        "correcting_time_estimate": 25,
+        "tc_time_estimate": 15,
+        "quarter": 1,
+        "category": 3,
+        "user": user.data.get("data")[0].get("id"),
+        "department": department_id,
+    }
+    task = api_client.post(reverse("task-list"), data=task_data, format='json')
+    task_id = task.data.get("data")[0].get("id")
+
+    # Tracker is closed and a new one is opened (11:00)
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=1))
+    api_client.patch(
+        reverse("task-detail", kwargs={"pk": task_id}),
+        data={"status": Statuses.EDITING.value},
+        format="json",
+    )
+
+    # Hourly update of the open tracker (14:00)
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=3))
+    update_task_time_in_progress()
+
+    editing_rollup = TaskTimeRollup.objects.get(task_id=task_id, task_status=Statuses.EDITING.value)
+    assert editing_rollup.hours == 2
+    assert editing_rollup.trackers_count == 1
+    assert editing_rollup.last_end_time is None
+
+    # Tracker is closed (15:00)
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=1))
+    api_client.patch(
+        reverse("task-detail", kwargs={"pk": task_id}),
+        data={"status": Statuses.EDITING_QUEUE.value},
+        format="json",
+    )
+    editing_rollup.refresh_from_db()
+    assert editing_rollup.hours == 3
+    assert editing_rollup.last_end_time == datetime.datetime.now()
+
+    # End time of a closed tracker is edited and a gap tracker is created
+    editing_tt = TimeTracker.objects.get(task_id=task_id, task_status=Statuses.EDITING.value)
+    result = api_client.patch(
+        reverse("time_tracker-detail", kwargs={"pk": editing_tt.id}),
+        data={"end_time": editing_tt.end_time - datetime.timedelta(hours=1)},
+    )
+    assert result.data.get("success")
+    assert TaskTimeRollup.mismatches() == []
+
+    # Tracker is deleted
+    result = api_client.delete(reverse("time_tracker-detail", kwargs={"pk": editing_tt.id}))
+    assert result.data.get("success")
+    assert not TaskTimeRollup.objects.filter(task_id=task_id, task_status=Statuses.EDITING.value).exists()
+    assert TaskTimeRollup.mismatches() == []
+
+    # Rollups are rebuilt from scratch
+    TaskTimeRollup.objects.all().update(hours=100)
+    with pytest.raises(CommandError):
+        call_command("rebuild_time_rollups", "--verify-only")
+    call_command("rebuild_time_rollups")
+    assert TaskTimeRollup.mismatches() == []
+
+
+@pytest.mark.django_db
+def test_benchmark_indexes_command():
+
+    """
+    TestCase:
+    1) benchmark_indexes reports plans and timings of every hot query.
+    2) Generated data and dropped indexes are rolled back.
+    """
+
+    out = StringIO()
+    call_command("benchmark_indexes", trackers=200, repeat=1, stdout=out)
+    output = out.getvalue()
+    assert "in progress trackers" in output
+    assert "tracker_in_progress_task_uniq" in output
+    assert "rolled back" in output
+    assert not TimeTracker.objects.exists()
+    assert not Department.objects.filter(name__startswith="benchmark_").exists()
+    with connection.cursor() as cursor:
+        indexes = connection.introspection.get_constraints(cursor, TimeTracker._meta.db_table)
+    assert "tracker_in_progress_task_uniq" in indexes
+
+
+@pytest.mark.django_db
+def test_check_in_progress_constraints_command():
+
+    """
+    TestCase: check_in_progress_constraints finds nothing when every user has one task in progress.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task = create_task(user=user, department=department)
+    Task.objects.filter(id=task.id).update(status=Statuses.EDITING.value)
+
+    out = StringIO()
+    call_command("check_in_progress_constraints", stdout=out)
+    assert "No tasks or time trackers break the constraints" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_business_calendar_matches_businesstimedelta():
+
+    """
+    TestCase:
+    1) Business calendar rounds hours exactly like businesstimedelta.
+    2) Holidays are excluded from working time.
+    """
+
+    out = StringIO()
+    call_command("benchmark_business_calendar", samples=3000, stdout=out)
+    assert "Hours are identical" in out.getvalue()
+
+    calendar = BusinessCalendar(
+        start_time=datetime.time(9),
+        end_time=datetime.time(18),
+        working_days=[0, 1, 2, 3, 4],
+        breaks=[(datetime.time(13), datetime.time(14))],
+        holidays={datetime.date(2023, 1, 2)},
+    )
+    # Friday 17:00 - Tuesday 9:30, Monday is a holiday
+    start, end = datetime.datetime(2022, 12, 30, 17), datetime.datetime(2023, 1, 3, 9, 30)
+    assert calendar.working_seconds(start, end) == 90 * 60
+    assert calendar.hours(start, end) == 2
+    assert calendar.hours(end, start) == 2
+    # Outside of the precomputed table
+    assert calendar.hours(datetime.datetime(2015, 1, 5, 9), datetime.datetime(2015, 1, 5, 18)) == 8
+    assert calendar.hours(datetime.datetime(2045, 1, 2, 9), datetime.datetime(2045, 1, 2, 12)) == 3
+
+    # Readers see a consistent table while other threads grow it back
+    calendar = BusinessCalendar(
+        start_time=datetime.time(9),
+        end_time=datetime.time(18),
+        working_days=[0, 1, 2, 3, 4],
+        first_date=datetime.date(2023, 1, 1),
+        days=60,
+    )
+    results = []
+
+    def read():
+        for _ in range(2000):
+            results.append(calendar.working_seconds(start, end))
+
+    def grow_back(year):
+        calendar.working_seconds(datetime.datetime(year, 1, 2), start)
+
+    threads = [threading.Thread(target=read) for _ in range(4)] + [
+        threading.Thread(target=grow_back, args=(year,)) for year in range(2022, 1900, -10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert set(results) == {10 * 3600 + 30 * 60}
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-05 10:00:00")
+def test_update_time_trackers_hours_in_bulk(freezer):
+
+    """
+    TestCase:
+    1) Hours of all in progress time trackers are written with a fixed number of queries.
+    2) Task time rollups stay consistent.
+    3) Unchanged time trackers are not written.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    for num in range(5):
+        create_task(user=user, department=department, name=f"M-34-00{num}-A")
+    TimeTracker.objects.update(start_time=datetime.datetime.now())
+
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=2))
+    with CaptureQueriesContext(connection) as queries:
+        result = update_time_trackers_hours()
+    assert "Updated time for 5 time trackers" in result
+    # select, bulk update, rollups update per task status
+    assert len(queries) <= 1 + 1 + 5 + 2
+    assert set(TimeTracker.objects.values_list("hours", flat=True)) == {2}
+    assert not TaskTimeRollup.mismatches()
+
+    result = update_time_trackers_hours()
+    assert "Updated time for 0 time trackers" in result
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-05 10:00:00")
+def test_live_hours_of_in_progress_trackers(api_client, super_user, freezer, settings):
+
+    """
+    TestCase:
+    1) In live hours mode in progress trackers show hours counted on read, without writes.
+    2) Task time done, capacity report and forecast include live hours of in progress trackers.
+    3) Closed trackers show stored hours.
+    """
+
+    settings.TIME_TRACKER_LIVE_HOURS = True
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task = create_task(user=user, department=department)
+    TimeTracker.objects.update(start_time=datetime.datetime.now(), task_status=Statuses.EDITING.value)
+    Task.objects.update(status=Statuses.EDITING.value, year=2023, quarter=2)
+    TaskTimeRollup.rebuild()
+    tracker = TimeTracker.objects.get(task=task)
+
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=2))
+    api_client.force_authenticate(super_user)
+
+    result = api_client.get(reverse("time_tracker-detail", kwargs={"pk": tracker.id}))
+    assert result.data.get("data")[0].get("hours") == 2
+    assert TimeTracker.objects.get(id=tracker.id).hours == 0
+
+    result = api_client.get(f'{reverse("task-list")}?fields=id,editing_time_done')
+    assert result.data.get("data")[0].get("editing_time_done") == 2
+    result = api_client.get(reverse("task-detail", kwargs={"pk": task.id}))
+    assert result.data.get("data")[0].get("editing_time_done") == 2
+
+    result = api_client.get(f'{reverse("report-capacity")}?year=2023')
+    rows = {row["role"]: row for row in result.data.get("data")[0]["rows"]}
+    assert rows[UserRoles.EDITOR.value]["remaining_hours"] == 50 - 2
+    refresh_task_forecasts()
+    assert TaskForecast.objects.get(task=task).remaining_hours == 50 - 2 + 25 + 15
+
+    tracker.refresh_from_db()
+    tracker.change_status_done()
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(hours=1))
+    result = api_client.get(reverse("time_tracker-detail", kwargs={"pk": tracker.id}))
+    assert result.data.get("data")[0].get("hours") == 2
+    result = api_client.get(f'{reverse("task-list")}?fields=id,editing_time_done')
+    assert result.data.get("data")[0].get("editing_time_done") == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-07 12:00:00")
+def test_time_trackers_bulk_edit(api_client, super_user):
+
+    """
+    TestCase:
+    1) bulk_edit moves the border between two trackers and recalculates hours with one update.
+    2) Overlaps, gaps and change of the first tracker start are rejected, nothing is saved.
+    3) Only admin or head of the department can edit.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task = create_task(user=user, department=department)
+    TimeTracker.objects.get(task=task).delete()
+    trackers_data = [
+        (datetime.datetime(2023, 6, 5, 9), datetime.datetime(2023, 6, 5, 15), Statuses.EDITING.value),
+        (datetime.datetime(2023, 6, 5, 15), datetime.datetime(2023, 6, 6, 12), Statuses.EDITING.value),
+        (datetime.datetime(2023, 6, 6, 12), None, Statuses.CORRECTING.value),
+    ]
+    first, second, third = [
+        TimeTracker.objects.create(
+            task=task,
+            user=user,
+            start_time=start_time,
+            end_time=end_time,
+            status=TimeTrackerStatuses.DONE if end_time else TimeTrackerStatuses.IN_PROGRESS,
+            task_status=task_status,
+            task_department=department,
+        )
+        for start_time, end_time, task_status in trackers_data
+    ]
+    url = reverse("time_tracker-bulk-edit")
+
+    def bulk_edit(*edits):
+        return api_client.post(
+            url, data={"task": task.id, "time_trackers": list(edits)}, format="json"
+        )
+
+    api_client.force_authenticate(user)
+    result = bulk_edit({"id": second.id, "start_time": "2023-06-05T11:00:00"})
+    assert result.status_code == 403
+
+    api_client.force_authenticate(super_user)
+    for edits in [
+        [{"id": second.id, "start_time": "2023-06-05T10:00:00"}],
+        [{"id": first.id, "end_time": "2023-06-05T10:00:00"}],
+        [{"id": first.id, "start_time": "2023-06-05T10:00:00"}],
+        [{"id": third.id, "end_time": "2023-06-07T10:00:00"}],
+    ]:
+        result = bulk_edit(*edits)
+        assert result.status_code == 400
+        assert not result.data.get("success")
+    assert TimeTracker.objects.get(id=first.id).end_time == datetime.datetime(2023, 6, 5, 15)
+    assert TimeTracker.objects.get(id=second.id).start_time == datetime.datetime(2023, 6, 5, 15)
+
+    with CaptureQueriesContext(connection) as queries:
+        result = bulk_edit(
+            {"id": first.id, "end_time": "2023-06-05T11:00:00"},
+            {"id": second.id, "start_time": "2023-06-05T11:00:00"},
+        )
+    assert result.status_code == 200
+    assert len(
+        [query for query in queries if query["sql"].startswith('UPDATE "api_timetracker"')]
+    ) == 1
+    hours = {tracker["id"]: tracker["hours"] for tracker in result.data.get("data")}
+    assert hours[first.id] == 2
+    assert hours[second.id] == 9
+    assert TimeTracker.objects.get(id=second.id).hours == 9
+    assert not TaskTimeRollup.mismatches()
+
+
+@pytest.mark.django_db
+def test_time_trackers_bulk_edit_after_status_change(api_client, super_user):
+
+    """
+    TestCase (time is not frozen):
+    1) Status change closes the tracker at the same moment the next one starts.
+    2) bulk_edit accepts the timeline, also with a sub-second gap left by older status changes.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    task = create_task(department=department)
+    TimeTracker.objects.update(start_time=datetime.datetime.now() - datetime.timedelta(hours=1))
+    api_client.force_authenticate(super_user)
+
+    result = api_client.patch(
+        reverse("task-detail", kwargs={"pk": task.id}),
+        data={"user": user.id, "status": Statuses.EDITING.value},
+        format="json",
+    )
+    assert result.status_code == 200
+    closed, started = TimeTracker.objects.filter(task=task).order_by("id")
+    assert closed.end_time == started.start_time
+
+    url = reverse("time_tracker-bulk-edit")
+    result = api_client.post(
+        url, data={"task": task.id, "time_trackers": [{"id": started.id}]}, format="json"
+    )
+    assert result.status_code == 200
+
+    TimeTracker.objects.filter(id=started.id).update(
+        start_time=started.start_time + datetime.timedelta(microseconds=30)
+    )
+    result = api_client.post(
+        url, data={"task": task.id, "time_trackers": [{"id": started.id}]}, format="json"
+    )
+    assert result.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-09 12:00:00")
+def test_scan_time_trackers_command():
+
+    """
+    TestCase:
+    1) scan_time_trackers finds overlaps, gaps, in progress trackers in the middle and wrong hours.
+    2) With --repair the timelines are fixed and task time rollups stay consistent.
+    3) Sub-second gaps left by status changes are neither reported nor filled.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    tasks = [
+        create_task(user=user, department=department, name=name)
+        for name in ["M-34-001-A", "M-34-002-A"]
+    ]
+    for task in tasks:
+        TimeTracker.objects.get(task=task).delete()
+
+    def create_tracker(task, start_time, end_time):
+        return TimeTracker.objects.create(
+            task=task,
+            user=user,
+            start_time=start_time,
+            end_time=end_time,
+            status=TimeTrackerStatuses.DONE if end_time else TimeTrackerStatuses.IN_PROGRESS,
+            task_status=Statuses.EDITING.value,
+            task_department=department,
+        )
+
+    day = datetime.datetime(2023, 6, 5)
+    # Task 1: open tracker in the middle, then overlap
+    create_tracker(tasks[0], day.replace(hour=9), None)
+    overlapping = create_tracker(tasks[0], day.replace(hour=11), day.replace(hour=16))
+    create_tracker(tasks[0], day.replace(hour=15), day.replace(hour=17))
+    # Task 2: gap and wrong stored hours, then a sub-second gap of a status change
+    create_tracker(tasks[1], day.replace(hour=9), day.replace(hour=10))
+    wrong_hours = create_tracker(tasks[1], day.replace(hour=12), day.replace(hour=16))
+    create_tracker(tasks[1], day.replace(hour=16, microsecond=40), day.replace(hour=17))
+    TimeTracker.objects.filter(id=wrong_hours.id).update(hours=10)
+
+    out = StringIO()
+    with pytest.raises(CommandError) as error:
+        call_command("scan_time_trackers", stdout=out)
+    assert "gap: 1" in str(error.value)
+    assert "hours: 1" in str(error.value)
+    assert "open_not_last: 1" in str(error.value)
+    assert "overlap: 1" in str(error.value)
+
+    call_command("scan_time_trackers", repair=True, batch_size=2, stdout=out)
+    assert "Repaired 4 time trackers" in out.getvalue()
+    assert TimeTracker.objects.get(id=overlapping.id).end_time == day.replace(hour=15)
+    assert TimeTracker.objects.get(id=wrong_hours.id).hours == 3
+    assert not TimeTracker.objects.filter(status=TimeTrackerStatuses.IN_PROGRESS).exists()
+    assert TimeTracker.objects.filter(task=tasks[1], task_status=Statuses.EDITING_QUEUE.value).count() == 1
+    assert not TaskTimeRollup.mismatches()
+
+    out = StringIO()
+    call_command("scan_time_trackers", stdout=out)
+    assert "consistent" in out.getvalue()
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-14 12:00:00")
+def test_time_trackers_timesheet(api_client, super_user, freezer, settings):
+
+    """
+    TestCase:
+    1) Timesheet splits trackers into working hours per day, task and task status.
+    2) Closed weeks are cached until trackers of the user change or move to another user.
+    3) Users can not see timesheets of other users, unless they are admins or heads.
+    """
+
+    user_data = default_user_data(2, roles=[UserRoles.EDITOR.value, UserRoles.EDITOR.value])
+    user, department = create_user_with_department(next(user_data))
+    other_user, _ = create_user_with_department(next(user_data))
+    task = create_task(user=user, department=department)
+    task_2 = create_task(user=user, department=department, name="M-34-002-A")
+    for tracker in TimeTracker.objects.all():
+        tracker.delete()
+
+    def create_tracker(task, start_time, end_time, task_status):
+        return TimeTracker.objects.create(
+            task=task,
+            user=user,
+            start_time=start_time,
+            end_time=end_time,
+            status=TimeTrackerStatuses.DONE if end_time else TimeTrackerStatuses.IN_PROGRESS,
+            task_status=task_status,
+            task_department=department,
+        )
+
+    first = create_tracker(
+        task, datetime.datetime(2023, 6, 5, 15), datetime.datetime(2023, 6, 6, 11), Statuses.EDITING.value
+    )
+    create_tracker(
+        task, datetime.datetime(2023, 6, 7, 9), datetime.datetime(2023, 6, 7, 12, 30), Statuses.CORRECTING.value
+    )
+    create_tracker(task_2, datetime.datetime(2023, 6, 13, 17), None, Statuses.EDITING.value)
+
+    api_client.force_authenticate(user)
+    result = api_client.get(
+        f'{reverse("time_tracker-timesheet")}?user={user.id}&from=2023-06-05&to=2023-06-14'
+    )
+    assert result.status_code == 200
+    timesheet = result.data.get("data")[0]
+    assert len(timesheet["days"]) == 10
+    rows = {(row["task"], row["task_status"]): row for row in timesheet["rows"]}
+    assert rows[(task.id, Statuses.EDITING.value)]["hours"] == {"2023-06-05": 3, "2023-06-06": 2}
+    assert rows[(task.id, Statuses.CORRECTING.value)]["total"] == 3.5
+    assert rows[(task_2.id, Statuses.EDITING.value)]["hours"] == {"2023-06-13": 1, "2023-06-14": 3}
+    assert timesheet["totals"]["2023-06-05"] == 3
+    assert timesheet["total"] == 12.5
+
+    url = f'{reverse("time_tracker-timesheet")}?user={user.id}&from=2023-06-05&to=2023-06-09'
+    api_client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        result = api_client.get(url)
+    assert not [query for query in queries if "api_timetracker" in query["sql"]]
+    assert result.data.get("data")[0]["total"] == 8.5
+
+    first.end_time = datetime.datetime(2023, 6, 6, 10)
+    first.save()
+    result = api_client.get(url)
+    assert result.data.get("data")[0]["total"] == 7.5
+
+    # Without the shared cache closed weeks expire, as other processes can not invalidate them
+    TimeTracker.objects.filter(id=first.id).update(end_time=datetime.datetime(2023, 6, 6, 11))
+    assert api_client.get(url).data.get("data")[0]["total"] == 7.5
+    freezer.move_to(
+        datetime.datetime.now() + datetime.timedelta(seconds=settings.TIMESHEET_CACHE_TIMEOUT + 1)
+    )
+    assert api_client.get(url).data.get("data")[0]["total"] == 8.5
+    first.refresh_from_db()
+    first.end_time = datetime.datetime(2023, 6, 6, 10)
+    first.save()
+
+    result = api_client.get(f'{reverse("time_tracker-timesheet")}?user={user.id}&from=2023-06-09&to=2023-06-05')
+    assert result.status_code == 400
+
+    api_client.force_authenticate(other_user)
+    result = api_client.get(url)
+    assert result.status_code == 403
+
+    api_client.force_authenticate(super_user)
+    result = api_client.get(url)
+    assert result.data.get("data")[0]["total"] == 7.5
+
+    # Hours of a tracker moved to another user leave the cached timesheet of the previous one
+    first.refresh_from_db()
+    first.user = other_user
+    first.save()
+    assert api_client.get(url).data.get("data")[0]["total"] == 3.5
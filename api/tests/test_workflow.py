@@ -1,11 +1,18 @@
 import datetime
-import pytest
+from types import SimpleNamespace
 
+import pytest
+from django.db import connection, transaction, IntegrityError
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
 from rest_framework.reverse import reverse
+from rest_framework.test import APIRequestFactory
 
-from api.models import Statuses
+from api.models import Statuses, Task, TimeTracker
 from api.choices import UserRoles, TimeTrackerStatuses
+from api.serializers.api_serializers import TaskSerializer
 from api.utils import update_time_trackers_hours
+from api.workflow import TRANSITIONS, is_department_bound, transition
 from conftest import create_user_with_department, create_task, default_user_data
 from kanban.settings import launch_time
 
@@ -242,3 +249,185 @@ def test_aggregate_status_time_done(api_client, super_user, freezer):
 
     assert task_1_updated.data.get("data")[0].get("editing_time_done") == 3
     assert task_2_updated.data.get("data")[0].get("editing_time_done") == 6
+
+
+
+@pytest.mark.django_db
+def test_task_list_time_done_annotations(api_client, super_user):
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    user_executant, department = create_user_with_department(next(user_data))
+    task_1 = create_task(department=department, name="M-36-23-B")
+    task_2 = create_task(department=department, name="M-36-101-A")
+
+    for task_status, hours in [
+        (Statuses.EDITING.value, 3),
+        (Statuses.EDITING.value, 2),
+        (Statuses.CORRECTING.value, 4),
+        (Statuses.TC.value, 1),
+    ]:
+        TimeTracker.objects.create(
+            task=task_1,
+            user=user_executant,
+            task_status=task_status,
+            task_department=department,
+            status=TimeTrackerStatuses.DONE.value,
+            hours=hours,
+        )
+
+    api_client.force_authenticate(super_user)
+    tasks = api_client.get(f'{reverse("task-list")}?ordering=id')
+
+    assert tasks.data.get("success")
+    task_1_data, task_2_data = tasks.data.get("data")
+    assert task_1_data.get("editing_time_done") == 5
+    assert task_1_data.get("correcting_time_done") == 4
+    assert task_1_data.get("tc_time_done") == 1
+    assert task_2_data.get("editing_time_done") == 0
+    assert task_2_data.get("correcting_time_done") == 0
+    assert task_2_data.get("tc_time_done") == 0
+
+    task_1.refresh_from_db()
+    assert task_1.editing_time_done == 5
+    assert task_1.correcting_time_done == 4
+    assert task_1.tc_time_done == 1
+
+
+@pytest.mark.django_db
+def test_workflow_transition_table():
+
+    """
+    TestCase:
+    1) Transition table is frozen and covers every role, flag and status pair.
+    2) transition() checks role, reopen, assignment and user rules without queries.
+    """
+
+    with pytest.raises(TypeError):
+        TRANSITIONS[(None, False, False, "EDITING", "TC")] = None
+    assert len(TRANSITIONS) == 4 * 2 * 2 * len(Statuses) ** 2
+
+    department = SimpleNamespace(head_id=10)
+    editor = SimpleNamespace(id=1, role=UserRoles.EDITOR.value, is_admin=False)
+    verifier = SimpleNamespace(id=2, role=UserRoles.VERIFIER.value, is_admin=False)
+    admin = SimpleNamespace(id=3, role=UserRoles.EDITOR.value, is_admin=True, is_head_department=False)
+    head = SimpleNamespace(id=10, role=UserRoles.CORRECTOR.value, is_admin=False, is_head_department=True)
+    # Admin and head of another department
+    other_head = SimpleNamespace(id=4, role=UserRoles.EDITOR.value, is_admin=True, is_head_department=True)
+
+    def task(status, user=None):
+        return SimpleNamespace(status=status, user_id=user.id if user else None, department=department)
+
+    with CaptureQueriesContext(connection) as queries:
+        with pytest.raises(ValidationError):
+            transition(editor, task(Statuses.EDITING.value, editor), status=Statuses.TC.value)
+        # Editor takes own task to work without setting the user
+        rule = transition(editor, task(Statuses.EDITING_QUEUE.value, editor), status=Statuses.EDITING.value)
+        assert rule.changes_status and rule.requires_user and not rule.finishes
+        with pytest.raises(ValidationError):
+            transition(admin, task(Statuses.EDITING_QUEUE.value), status=Statuses.EDITING.value)
+        with pytest.raises(ValidationError):
+            transition(admin, task(Statuses.TC_QUEUE.value), status=Statuses.TC.value, user=editor)
+        assert transition(admin, task(Statuses.TC_QUEUE.value), status=Statuses.TC.value, user=verifier)
+
+        done_task = task(Statuses.DONE.value)
+        with pytest.raises(ValidationError):
+            transition(verifier, done_task, status=Statuses.TC_QUEUE.value)
+        assert transition(head, done_task, status=Statuses.CORRECTING_QUEUE.value).reopens
+        rule = transition(admin, done_task, status=Statuses.EDITING.value)
+        assert rule.reopens and not rule.requires_user
+
+        rule = transition(admin, task(Statuses.CORRECTING.value), status=Statuses.EDITING_QUEUE.value)
+        assert rule.queue_work_status == Statuses.EDITING.value
+        assert transition(admin, task(Statuses.TC.value), status=Statuses.DONE.value).finishes
+        # Only admin, who is not a head of any department, can change the user without the status
+        with pytest.raises(ValidationError):
+            transition(head, task(Statuses.EDITING.value, editor), user=editor)
+        with pytest.raises(ValidationError):
+            transition(other_head, task(Statuses.EDITING.value, editor), user=editor)
+        assert not transition(admin, task(Statuses.EDITING.value, editor), user=editor).changes_status
+    assert not queries
+
+    assert is_department_bound(UserRoles.EDITOR.value, Statuses.TC_QUEUE.value)
+    assert not is_department_bound(UserRoles.EDITOR.value, Statuses.DONE.value)
+    assert not is_department_bound(UserRoles.CORRECTOR.value, Statuses.CORRECTING.value)
+    assert is_department_bound(UserRoles.CORRECTOR.value, Statuses.TC.value)
+    assert not is_department_bound(UserRoles.VERIFIER.value, Statuses.TC.value)
+
+
+@pytest.mark.django_db
+@pytest.mark.freeze_time("2023-06-05 09:00:00")
+def test_task_update_query_budget(super_user):
+
+    """
+    TestCase:
+    1) Every kind of task update is saved within its query budget.
+    2) Trackers are restarted only when the status or the user changes.
+    """
+
+    user_data = default_user_data(2, roles=[UserRoles.EDITOR.value, UserRoles.EDITOR.value])
+    editor, department = create_user_with_department(next(user_data))
+    editor_2, department = create_user_with_department(next(user_data))
+    task = create_task(department=department)
+    request = APIRequestFactory().patch("/")
+    request.user = super_user
+
+    updates = [
+        ("fields", {"editing_time_estimate": 40}),
+        ("progress", {"status": Statuses.EDITING.value, "user": editor.id}),
+        ("user", {"user": editor_2.id}),
+        ("queue", {"status": Statuses.EDITING_QUEUE.value}),
+        ("done", {"status": Statuses.DONE.value}),
+        ("reopen", {"status": Statuses.CORRECTING_QUEUE.value}),
+    ]
+    for kind, data in updates:
+        instance = Task.objects.select_related("department", "user").get(id=task.id)
+        serializer = TaskSerializer(
+            instance, data=data, partial=True, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+        assert len(queries) <= TaskSerializer.UPDATE_QUERY_BUDGET[kind], kind
+
+    task.refresh_from_db()
+    assert task.status == Statuses.CORRECTING_QUEUE.value
+    assert task.done is None
+    assert task.user is None
+    # Created, editing, editing by the second user, editing queue, correcting queue
+    assert task.task_time_trackers.count() == 5
+    assert task.task_time_trackers.filter(status=TimeTrackerStatuses.IN_PROGRESS).count() == 1
+
+
+@pytest.mark.django_db
+def test_in_progress_constraints(api_client, super_user):
+
+    """
+    TestCase:
+    1) Second tracker in progress of a task is rejected by the database.
+    2) Second task of a user in progress is rejected by the database, the API
+       returns the active task of the user and nothing is changed.
+    """
+
+    user_data = default_user_data(1, roles=[UserRoles.EDITOR.value])
+    editor, department = create_user_with_department(next(user_data))
+    task = create_task(department=department)
+    task_2 = create_task(department=department, name="M-37-104-А")
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        TimeTracker.objects.create(task=task, task_department=department)
+
+    Task.objects.filter(id=task.id).update(status=Statuses.EDITING.value, user=editor)
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Task.objects.filter(id=task_2.id).update(status=Statuses.CORRECTING.value, user=editor)
+
+    api_client.force_authenticate(super_user)
+    result = api_client.patch(
+        reverse("task-detail", kwargs={"pk": task_2.id}),
+        data={"user": editor.id, "status": Statuses.EDITING.value}, format="json"
+    )
+    assert result.status_code == 400
+    assert result.data["errors"][0]["detail"] == f"У користувача {editor.username} вже є активна задача {task.name}"
+    task_2.refresh_from_db()
+    assert task_2.status == Statuses.EDITING_QUEUE.value
+    assert task_2.user is None
+    assert task_2.task_time_trackers.get().status == TimeTrackerStatuses.IN_PROGRESS
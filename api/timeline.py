@@ -0,0 +1,251 @@
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from api.choices import TimeTrackerStatuses, Statuses
+from api.models import TimeTracker, TaskTimeRollup
+from kanban.settings import business_calendar
+
+
+class TaskTimeline:
+    """
+    Time trackers of one task as a list of intervals sorted by start time.
+    Each tracker has to start when the previous one ends, only the last one can be in progress.
+    """
+
+    def __init__(self, task, trackers):
+        self.task = task
+        self.trackers = sorted(trackers, key=self._sort_key)
+        self.by_id = {tracker.id: tracker for tracker in self.trackers}
+
+    @classmethod
+    def load(cls, task, lock=False):
+        """Load all time trackers of the task with one query."""
+        trackers = TimeTracker.objects.filter(task=task)
+        if lock:
+            trackers = trackers.select_for_update()
+        return cls(task, trackers)
+
+    @staticmethod
+    def _sort_key(tracker):
+        return tracker.start_time or datetime.min, tracker.id
+
+    def neighbours(self, tracker):
+        """Previous and next trackers of the tracker in the timeline."""
+        index = self.trackers.index(self.by_id[tracker.id])
+        previous_tracker = self.trackers[index - 1] if index > 0 else None
+        next_tracker = self.trackers[index + 1] if index + 1 < len(self.trackers) else None
+        return previous_tracker, next_tracker
+
+    def errors(self):
+        """Overlaps, gaps and invalid intervals found in one pass over the timeline."""
+        errors = []
+        time_now = datetime.now()
+        previous_tracker = None
+        for tracker in self.trackers:
+            if not tracker.start_time:
+                errors.append(f"Трекер {tracker.id}: не вказаний час старту.")
+                previous_tracker = None
+                continue
+            if tracker.end_time and tracker.end_time < tracker.start_time:
+                errors.append(
+                    f"Трекер {tracker.id}: час закінчення трекера не може бути раніше його початку."
+                )
+            if max(tracker.start_time, tracker.end_time or tracker.start_time) > time_now:
+                errors.append(
+                    f"Трекер {tracker.id}: час трекера не може бути пізнішим ніж поточний час."
+                )
+            if previous_tracker:
+                if not previous_tracker.end_time:
+                    errors.append(
+                        f"Трекер {previous_tracker.id}: незавершений трекер має бути останнім."
+                    )
+                elif tracker.start_time < previous_tracker.end_time:
+                    errors.append(
+                        f"Трекери {previous_tracker.id} і {tracker.id} перетинаються."
+                    )
+                elif tracker.start_time - previous_tracker.end_time > settings.TIME_TRACKERS_GAP_TOLERANCE:
+                    errors.append(
+                        f"Між трекерами {previous_tracker.id} і {tracker.id} є проміжок часу."
+                    )
+            previous_tracker = tracker
+        return errors
+
+    def apply(self, edits):
+        """
+        Apply start_time/end_time edits to the trackers, validate the whole timeline
+        and save changed trackers with recalculated hours by one bulk update.
+        Nothing is saved when any error is found.
+        """
+        errors = []
+        changed = {}
+        first_tracker = self.trackers[0] if self.trackers else None
+        for edit in edits:
+            tracker = self.by_id.get(edit["id"])
+            if not tracker:
+                errors.append(f"Трекер {edit['id']} не належить задачі {self.task.id}.")
+                continue
+            if "start_time" in edit and edit["start_time"] != tracker.start_time:
+                if tracker is first_tracker:
+                    errors.append(
+                        f"Трекер {tracker.id}: час старту першого трекеру повинен співпадати з часом створення його задачі."
+                    )
+                    continue
+                tracker.start_time = edit["start_time"]
+                changed[tracker.id] = tracker
+            if "end_time" in edit and edit["end_time"] != tracker.end_time:
+                if tracker.status == TimeTrackerStatuses.IN_PROGRESS:
+                    errors.append(
+                        f"Трекер {tracker.id}: час закінчення незавершеного трекера не можна змінити."
+                    )
+                    continue
+                tracker.end_time = edit["end_time"]
+                changed[tracker.id] = tracker
+
+        self.trackers.sort(key=self._sort_key)
+        errors.extend(self.errors())
+        if errors:
+            raise ValidationError({"time_trackers": errors})
+
+        time_now = datetime.now()
+        for tracker in changed.values():
+            tracker.hours = business_calendar.hours(
+                tracker.start_time, tracker.end_time or time_now
+            )
+            tracker.updated = time_now
+            tracker.version += 1
+        TimeTracker.objects.bulk_update(
+            changed.values(), ["start_time", "end_time", "hours", "updated", "version"]
+        )
+        for task_status in {tracker.task_status for tracker in changed.values()}:
+            TaskTimeRollup.refresh(self.task.id, task_status)
+        TimeTracker.invalidate_timesheets(tracker.user_id for tracker in changed.values())
+        return list(changed.values())
+
+
+class TimelineScanner:
+    """
+    Checks timelines of all tasks in one pass over time trackers streamed in
+    (task, start_time) order. Only the previous tracker of the current task is kept,
+    repairs are written in batches, so memory does not depend on the number of trackers.
+
+    Repairs: in progress tracker followed by another one is closed at its start,
+    overlapping tracker is cut at the start of the next one, a gap is filled with
+    a tracker of the editing queue, like handle_update_time does, stored hours of
+    closed trackers are recalculated. Trackers without start or with end before
+    start are only reported.
+    """
+
+    def __init__(self, repair=False, batch_size=2000):
+        self.repair = repair
+        self.batch_size = batch_size
+        self.counts = Counter()
+        self.repaired = 0
+        self._changed = {}
+        self._created = []
+
+    def scan(self):
+        """Yield found anomalies as dicts with kind, task, tracker and message."""
+        trackers = TimeTracker.objects.order_by("task_id", "start_time", "id").iterator(
+            chunk_size=self.batch_size
+        )
+        previous_tracker = None
+        for tracker in trackers:
+            if previous_tracker and previous_tracker.task_id != tracker.task_id:
+                previous_tracker = None
+            yield from self._check(previous_tracker, tracker)
+            if tracker.start_time:
+                previous_tracker = tracker
+            if len(self._changed) + len(self._created) >= self.batch_size:
+                self.flush()
+        self.flush()
+
+    def _anomaly(self, kind, tracker, message):
+        self.counts[kind] += 1
+        return {"kind": kind, "task": tracker.task_id, "tracker": tracker.id, "message": message}
+
+    def _check(self, previous_tracker, tracker):
+        if not tracker.start_time:
+            yield self._anomaly("no_start", tracker, "tracker has no start time")
+            return
+        if tracker.end_time and tracker.end_time < tracker.start_time:
+            yield self._anomaly("reversed", tracker, "tracker ends before it starts")
+            return
+        if tracker.status == TimeTrackerStatuses.DONE and tracker.end_time:
+            hours = business_calendar.hours(tracker.start_time, tracker.end_time)
+            if hours != tracker.hours:
+                yield self._anomaly(
+                    "hours", tracker, f"stored hours {tracker.hours}, calculated {hours}"
+                )
+                self._change(tracker)
+        if not previous_tracker:
+            return
+
+        if not previous_tracker.end_time:
+            yield self._anomaly(
+                "open_not_last", previous_tracker, f"in progress, but tracker {tracker.id} follows it"
+            )
+            self._change(
+                previous_tracker, end_time=tracker.start_time, status=TimeTrackerStatuses.DONE
+            )
+        elif tracker.start_time < previous_tracker.end_time:
+            yield self._anomaly(
+                "overlap", previous_tracker, f"overlaps with tracker {tracker.id}"
+            )
+            self._change(previous_tracker, end_time=tracker.start_time)
+        elif tracker.start_time - previous_tracker.end_time > settings.TIME_TRACKERS_GAP_TOLERANCE:
+            yield self._anomaly(
+                "gap", previous_tracker, f"gap before tracker {tracker.id}"
+            )
+            if self.repair:
+                self._created.append(
+                    TimeTracker(
+                        task_id=tracker.task_id,
+                        user=None,
+                        start_time=previous_tracker.end_time,
+                        end_time=tracker.start_time,
+                        hours=business_calendar.hours(
+                            previous_tracker.end_time, tracker.start_time
+                        ),
+                        status=TimeTrackerStatuses.DONE,
+                        task_status=Statuses.EDITING_QUEUE.value,
+                        task_department_id=previous_tracker.task_department_id,
+                    )
+                )
+
+    def _change(self, tracker, **fields):
+        """Collect the repair of the tracker, a dry run leaves the tracker as it is."""
+        if not self.repair:
+            return
+        for field, value in fields.items():
+            setattr(tracker, field, value)
+        tracker.hours = business_calendar.hours(
+            tracker.start_time, tracker.end_time or datetime.now()
+        )
+        tracker.updated = datetime.now()
+        if tracker.id not in self._changed:
+            tracker.version += 1
+        self._changed[tracker.id] = tracker
+
+    def flush(self):
+        """Write collected repairs and refresh task time rollups they touch."""
+        if not self._changed and not self._created:
+            return
+        rollup_keys = {
+            (tracker.task_id, tracker.task_status)
+            for tracker in [*self._changed.values(), *self._created]
+        }
+        with transaction.atomic():
+            TimeTracker.objects.bulk_update(
+                self._changed.values(), ["end_time", "status", "hours", "updated", "version"]
+            )
+            TimeTracker.objects.bulk_create(self._created)
+            for task_id, task_status in rollup_keys:
+                TaskTimeRollup.refresh(task_id, task_status)
+        TimeTracker.invalidate_timesheets(tracker.user_id for tracker in self._changed.values())
+        self.repaired += len(self._changed) + len(self._created)
+        self._changed = {}
+        self._created = []
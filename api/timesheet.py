@@ -0,0 +1,126 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from api.models import TimeTracker
+from kanban.settings import business_calendar
+
+WEEK = timedelta(days=7)
+
+
+def _week_key(user_id, version, monday):
+    return f"timesheet:{user_id}:{version}:{monday.isoformat()}"
+
+
+def _week_cells(user_id, first_monday, last_monday):
+    """
+    Working seconds of the user per (day, task, task status) for the weeks,
+    from one query over the trackers overlapping them.
+    """
+    range_start = datetime.combine(first_monday, datetime.min.time())
+    range_end = datetime.combine(last_monday + WEEK, datetime.min.time())
+    trackers = TimeTracker.objects.filter(
+        Q(end_time__isnull=True) | Q(end_time__gt=range_start),
+        user_id=user_id,
+        start_time__lt=range_end,
+    ).values_list("task_id", "task__name", "task_status", "start_time", "end_time")
+
+    time_now = datetime.now()
+    weeks = defaultdict(lambda: defaultdict(int))
+    for task_id, task_name, task_status, start_time, end_time in trackers:
+        start_time = max(start_time, range_start)
+        end_time = min(end_time or time_now, range_end)
+        if end_time <= start_time:
+            continue
+        for day, seconds in business_calendar.working_seconds_by_day(start_time, end_time):
+            monday = day - timedelta(days=day.weekday())
+            weeks[monday][(day.isoformat(), task_id, task_name, task_status)] += seconds
+    return {
+        monday: [[*cell, seconds] for cell, seconds in cells.items()]
+        for monday, cells in weeks.items()
+    }
+
+
+def build_timesheet(user_id, date_from, date_to):
+    """
+    Working hours of the user between the dates by day, task and task status.
+    Weeks that are already over are cached for TIMESHEET_CACHE_TIMEOUT, without
+    expiration in the shared cache, and dropped by TimeTracker.invalidate_timesheets
+    when trackers of the user change.
+    """
+    today = date.today()
+    first_monday = date_from - timedelta(days=date_from.weekday())
+    mondays = []
+    monday = first_monday
+    while monday <= date_to:
+        mondays.append(monday)
+        monday += WEEK
+
+    version = TimeTracker.timesheet_version(user_id)
+    closed_keys = {
+        monday: _week_key(user_id, version, monday)
+        for monday in mondays
+        if monday + WEEK <= today
+    }
+    cached = cache.get_many(closed_keys.values())
+    weeks = {
+        monday: cached[key] for monday, key in closed_keys.items() if key in cached
+    }
+    missing = [monday for monday in mondays if monday not in weeks]
+    if missing:
+        computed = _week_cells(user_id, missing[0], missing[-1])
+        for monday in missing:
+            weeks[monday] = computed.get(monday, [])
+        cache.set_many(
+            {
+                closed_keys[monday]: weeks[monday]
+                for monday in missing
+                if monday in closed_keys
+            },
+            timeout=settings.TIMESHEET_CACHE_TIMEOUT,
+        )
+
+    days = [
+        (date_from + timedelta(days=offset)).isoformat()
+        for offset in range((date_to - date_from).days + 1)
+    ]
+    rows = {}
+    totals = defaultdict(int)
+    for monday in mondays:
+        for day, task_id, task_name, task_status, seconds in weeks[monday]:
+            if not days[0] <= day <= days[-1]:
+                continue
+            row = rows.setdefault(
+                (task_id, task_status),
+                {
+                    "task": task_id,
+                    "task_name": task_name,
+                    "task_status": task_status,
+                    "hours": defaultdict(int),
+                },
+            )
+            row["hours"][day] += seconds
+            totals[day] += seconds
+
+    def to_hours(seconds):
+        return round(seconds / 3600, 2)
+
+    return {
+        "user": user_id,
+        "from": date_from,
+        "to": date_to,
+        "days": days,
+        "rows": [
+            {
+                **row,
+                "hours": {day: to_hours(seconds) for day, seconds in row["hours"].items()},
+                "total": to_hours(sum(row["hours"].values())),
+            }
+            for row in sorted(rows.values(), key=lambda row: (row["task"], row["task_status"]))
+        ],
+        "totals": {day: to_hours(seconds) for day, seconds in totals.items()},
+        "total": to_hours(sum(totals.values())),
+    }
@@ -16,6 +16,11 @@ from .views import (
     TaskViewSet,
     CommentViewSet,
     TimeTrackerViewSet, DefaultsView,
+    ChangesView,
+    FlowReportView,
+    CapacityReportView,
+    board_events,
+    EventStreamTicketView,
 )
 
 router = DefaultRouter(trailing_slash=False)
@@ -36,4 +41,9 @@ urlpatterns = [
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
     path("defaults/", DefaultsView.as_view(), name="defaults"),
+    path("changes", ChangesView.as_view(), name="changes"),
+    path("reports/flow", FlowReportView.as_view(), name="report-flow"),
+    path("reports/capacity", CapacityReportView.as_view(), name="report-capacity"),
+    path("events/ticket", EventStreamTicketView.as_view(), name="board-events-ticket"),
+    path("events/departments/<int:department_id>", board_events, name="board-events"),
 ] + router.urls
@@ -1,8 +1,16 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import transaction
 from drf_standardized_errors.formatter import ExceptionFormatter
 from drf_standardized_errors.types import ErrorResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
 
-from api.models import TimeTracker
+from api.models import TimeTracker, TaskTimeRollup
 from api.choices import TimeTrackerStatuses
+from kanban.settings import business_calendar
 
 
 class ResponseInfo(object):
@@ -16,6 +24,12 @@ class ResponseInfo(object):
         }
 
 
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "Дані змінено іншим користувачем, оновіть їх та повторіть спробу."
+    default_code = "precondition_failed"
+
+
 class KanExceptionFormatter(ExceptionFormatter):
     def format_error_response(self, error_response: ErrorResponse):
         errors = []
@@ -28,14 +42,36 @@ class KanExceptionFormatter(ExceptionFormatter):
         return resp.response
 
 
-def update_time_trackers_hours():
+def update_time_trackers_hours(batch_size=1000):
     """
-    Start in cron once an hour to update time-trackers hours
+    Start in cron once an hour to update time-trackers hours.
+    Reads only the columns needed for hours and locks the in progress trackers,
+    so a tracker closed meanwhile is not overwritten with stale hours. Writes back
+    only changed hours in batches and moves task time rollups by the difference.
     """
-    time_trackers = TimeTracker.objects.filter(status=TimeTrackerStatuses.IN_PROGRESS)
-    if time_trackers:
-        task_ids = []
-        for tracker in time_trackers:
-            tracker.save()
-            task_ids.append(tracker.task.id)
-        return f'Updated time for {len(time_trackers)} tasks. Task ids: {task_ids}'
+    started = time.perf_counter()
+    time_now = datetime.now()
+    with transaction.atomic():
+        rows = (
+            TimeTracker.objects.select_for_update()
+            .filter(status=TimeTrackerStatuses.IN_PROGRESS, start_time__isnull=False)
+            .values_list("id", "task_id", "task_status", "start_time", "hours")
+        )
+
+        changed = []
+        rollup_deltas = defaultdict(int)
+        for tracker_id, task_id, task_status, start_time, hours in rows.iterator(chunk_size=batch_size):
+            new_hours = business_calendar.hours(start_time, time_now)
+            if new_hours != hours:
+                changed.append(TimeTracker(id=tracker_id, hours=new_hours, updated=time_now))
+                rollup_deltas[(task_id, task_status)] += new_hours - hours
+
+        TimeTracker.objects.bulk_update(changed, ["hours", "updated"], batch_size=batch_size)
+        for (task_id, task_status), delta in rollup_deltas.items():
+            TaskTimeRollup.add(task_id, task_status, hours=delta)
+
+    elapsed = time.perf_counter() - started
+    return (
+        f"Updated time for {len(changed)} time trackers of {len(rollup_deltas)} task statuses "
+        f"in {elapsed:.3f}s"
+    )
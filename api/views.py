@@ -1,22 +1,39 @@
+import asyncio
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.cache import cache
 from django.core.exceptions import BadRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Prefetch, Count, Q
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_standardized_errors.handler import exception_handler
 from rest_framework import status as http_status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError, PermissionDenied
 from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import (
     IsAuthenticated,
     IsAdminUser,
 )
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from .CONSTANTS import (
     TASK_NAME_REGEX,
 )
+from .events import get_broker, format_sse, issue_stream_ticket, redeem_stream_ticket
 from .filters import (
     UserFilter,
     TaskFilter,
@@ -35,9 +52,11 @@ from .models import (
     Task,
     Comment,
     TimeTracker,
+    Tombstone,
     Statuses,
     TaskScales,
     YearQuarter,
+    VersionedModel,
 )
 from .choices import UserRoles, TimeTrackerStatuses
 from .serializers import (
@@ -51,13 +70,30 @@ from .serializers import (
     UserUpdateSerializer,
     DepartmentCreateSerializer,
     UserBaseSerializer,
+    UserNormalizedSerializer,
+    TaskNormalizedSerializer,
+    SparseFieldsSerializerMixin,
+    TimeTrackerBulkEditSerializer,
+    TimesheetQuerySerializer,
+    ReportQuerySerializer,
+    CapacityReportQuerySerializer,
+    TaskBulkCreateSerializer,
+    TaskBulkTransitionSerializer,
 )
-from .utils import ResponseInfo
+from .pagination import KanCursorPagination
+from .renderers import NormalizedJSONRenderer
+from .reports import get_flow_report, build_capacity_report
+from .timeline import TaskTimeline
+from .timesheet import build_timesheet
+from .utils import ResponseInfo, PreconditionFailed
 
 
 class ResponseModelViewSet(ModelViewSet):
     serializer_classes = {}
     default_serializer_class = None
+    select_related_plan = {}
+    prefetch_related_plan = {}
+    cursor_ordering = None
 
     def __init__(self, **kwargs):
         self.response_format = ResponseInfo().response
@@ -94,18 +130,56 @@ class ResponseModelViewSet(ModelViewSet):
         self.response_format["success"] = True
         if not response_data.data:
             self.response_format["message"] = "Empty"
-        return Response(self.response_format)
+        return Response(self.response_format, headers=self.get_etag_headers())
 
     def update(self, request, *args, **kwargs):
-        response_data = super(ResponseModelViewSet, self).update(
-            request, *args, **kwargs
-        )
+        with transaction.atomic():
+            response_data = super(ResponseModelViewSet, self).update(
+                request, *args, **kwargs
+            )
         data_list = self.data_to_list(response_data.data)
         self.response_format["data"] = data_list
         self.response_format["data_len"] = len(data_list)
         self.response_format["success"] = True
         self.response_format["message"] = "Updated"
-        return Response(self.response_format)
+        return Response(self.response_format, headers=self.get_etag_headers())
+
+    def perform_update(self, serializer):
+        self.claim_object_version(serializer.instance)
+        super(ResponseModelViewSet, self).perform_update(serializer)
+
+    def get_object(self):
+        instance = super(ResponseModelViewSet, self).get_object()
+        if isinstance(instance, VersionedModel):
+            self.versioned_object = instance
+        return instance
+
+    def get_etag_headers(self):
+        instance = getattr(self, "versioned_object", None)
+        return {"ETag": instance.etag} if instance else {}
+
+    def claim_object_version(self, instance):
+        """
+        Optimistic concurrency control of versioned rows: the version sent in
+        If-Match, or the loaded one without it, is claimed by a conditional update
+        once per request. Changed rows are answered with 412.
+        """
+        if not isinstance(instance, VersionedModel):
+            return
+        if getattr(self, "version_claimed", False):
+            # The row is read again after the claim, its version is already incremented
+            instance._version_claimed = True
+            return
+        if_match = self.request.headers.get("If-Match", "").strip()
+        version = instance.version
+        if if_match and if_match != "*":
+            try:
+                version = int(if_match.removeprefix("W/").strip('"'))
+            except ValueError:
+                raise PreconditionFailed()
+        if not instance.claim_version(version):
+            raise PreconditionFailed()
+        self.version_claimed = True
 
     def destroy(self, request, *args, **kwargs):
         response_data = super(ResponseModelViewSet, self).destroy(
@@ -117,9 +191,79 @@ class ResponseModelViewSet(ModelViewSet):
         self.response_format["message"] = "Deleted"
         return Response(self.response_format)
 
+    @property
+    def paginator(self):
+        """
+        Cursor pagination is opt-in: ?pagination=cursor or ?cursor=<token>,
+        for views that declare a `cursor_ordering`.
+        """
+        if not hasattr(self, "_paginator"):
+            self._paginator = None
+            query_params = self.request.query_params
+            if self.cursor_ordering and (
+                query_params.get("pagination") == "cursor" or "cursor" in query_params
+            ):
+                self._paginator = KanCursorPagination()
+        return self._paginator
+
+    def get_paginated_response(self, data):
+        self.response_format["next"] = self.paginator.get_next_link()
+        self.response_format["previous"] = self.paginator.get_previous_link()
+        return Response(data)
+
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.default_serializer_class)
 
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, SparseFieldsSerializerMixin):
+            kwargs.setdefault("fields", self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_requested_fields(self):
+        """
+        Serializer fields selected with ?fields= and ?expand= on reads,
+        None when the full representation is requested.
+        """
+        if self.action not in ["list", "retrieve"]:
+            return None
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsSerializerMixin):
+            return None
+
+        fields = self.request.query_params.get("fields")
+        expand = self.request.query_params.get("expand")
+        if fields is None and expand is None:
+            return None
+        fields = [field for field in (fields or "").split(",") if field]
+        expand = [field for field in (expand or "").split(",") if field]
+        return set(fields or serializer_class.get_default_sparse_fields()) | set(expand)
+
+    def is_field_requested(self, field):
+        requested_fields = self.get_requested_fields()
+        return requested_fields is None or field in requested_fields
+
+    def apply_query_plan(self, queryset):
+        """
+        Load the relations declared in the plan for the requested fields
+        together with the queryset, so nested representations do not query
+        the db per object.
+        """
+        select_related = []
+        for field, lookups in self.select_related_plan.items():
+            if self.is_field_requested(field):
+                select_related.extend(lookups)
+        prefetch_related = []
+        for field, lookups in self.prefetch_related_plan.items():
+            if self.is_field_requested(field):
+                prefetch_related.extend(lookups)
+
+        if select_related:
+            queryset = queryset.select_related(*dict.fromkeys(select_related))
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*dict.fromkeys(prefetch_related))
+        return queryset
+
     def get_exception_handler(self):
         return exception_handler
 
@@ -259,21 +403,177 @@ class TaskViewSet(ResponseModelViewSet):
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = TaskFilter
     ordering_fields = '__all__'
+    cursor_ordering = ("updated", "id")
+    trackers_prefetch = Prefetch(
+        "task_time_trackers",
+        queryset=TimeTracker.objects.select_related("user__department"),
+    )
+    select_related_plan = {
+        "user_obj": ["user__department"],
+        "department_obj": ["department"],
+        "map_sheet": ["map_sheet"],
+        "eta": ["forecast"],
+    }
+    prefetch_related_plan = {
+        "time_trackers": [trackers_prefetch],
+        "involved_users": [trackers_prefetch],
+    }
 
-    def update(self, request, *args, **kwargs):
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NormalizedJSONRenderer]
+
+    def is_normalized_format(self):
+        accepted_renderer = getattr(self.request, "accepted_renderer", None)
+        return self.action == "list" and isinstance(accepted_renderer, NormalizedJSONRenderer)
+
+    def get_serializer_class(self):
+        if self.is_normalized_format():
+            return TaskNormalizedSerializer
+        return super().get_serializer_class()
+
+    @staticmethod
+    def get_side_loaded_entities(tasks):
+        """
+        Users and departments referenced by the serialized tasks, each serialized once.
+        """
+        user_ids = set()
+        for task in tasks:
+            if task.get("user"):
+                user_ids.add(task["user"])
+            user_ids.update(task.get("involved_users", []))
+        users = UserNormalizedSerializer(
+            User.objects.filter(id__in=user_ids).select_related("department"), many=True
+        ).data
+
+        department_ids = {task["department"] for task in tasks if task.get("department")}
+        department_ids.update(user["department"] for user in users if user["department"])
+        departments = DepartmentSerializer(
+            Department.objects.filter(id__in=department_ids), many=True
+        ).data
+        return {
+            "users": {user["id"]: user for user in users},
+            "departments": {department["id"]: department for department in departments},
+        }
 
-        if status := request.data.get("status"):
-            self.request.user.can_change_task_status(status)
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self.is_normalized_format():
+            response.data.update(self.get_side_loaded_entities(response.data["data"]))
+        return response
+
+    facet_fields = ["status", "scale", "quarter", "department"]
+
+    def get_facets_cache_key(self):
+        """
+        Cache key built from the TaskFilter params only, sorted, so the same
+        filter in any param order or with extra params shares one entry.
+        """
+        filter_names = self.filterset_class.base_filters.keys()
+        params = sorted(
+            (name, sorted(values))
+            for name, values in self.request.query_params.lists()
+            if name in filter_names
+        )
+        digest = hashlib.md5(urlencode(params, doseq=True).encode()).hexdigest()
+        return f"task_facets:{digest}"
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request, *args, **kwargs):
+        """
+        Number of filtered tasks per status, scale, quarter and department.
+        """
+        cache_key = self.get_facets_cache_key()
+        facets = cache.get(cache_key)
+        if facets is None:
+            queryset = self.filter_queryset(Task.objects.all())
+            rows = (
+                queryset.order_by()
+                .values(*self.facet_fields)
+                .annotate(count=Count("id"))
+            )
+            facets = {field: defaultdict(int) for field in self.facet_fields}
+            total = 0
+            for row in rows:
+                total += row["count"]
+                for field in self.facet_fields:
+                    facets[field][row[field]] += row["count"]
+            facets = {field: dict(counts) for field, counts in facets.items()}
+            facets["total"] = total
+            cache.set(cache_key, facets, settings.TASK_FACETS_CACHE_TIMEOUT)
+
+        self.response_format["data"] = [facets]
+        self.response_format["data_len"] = 1
+        self.response_format["success"] = True
+        return Response(self.response_format)
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Create a list of tasks at once. Nothing is created when any task is invalid,
+        errors are returned per item index.
+        """
+        serializer = TaskBulkCreateSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.TASKS_BULK_MAX_LENGTH,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        tasks = serializer.save()
 
-        user_to_update = User.objects.get_or_none(id=request.data.get("user"))
-        if user_to_update:
-            user_to_update.can_be_set_as_task_user(status, request.user)
+        self.response_format["data"] = [{"id": task.id, "name": task.name} for task in tasks]
+        self.response_format["data_len"] = len(tasks)
+        self.response_format["success"] = True
+        self.response_format["message"] = "Created"
+        return Response(self.response_format)
+
+    @action(detail=False, methods=["post"])
+    def bulk_transition(self, request, *args, **kwargs):
+        """
+        Change status and/or user of the tasks by ids at once.
+        """
+        serializer = TaskBulkTransitionSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        tasks = serializer.save()
+
+        self.response_format["data"] = [task.get_event_data() for task in tasks]
+        self.response_format["data_len"] = len(tasks)
+        self.response_format["success"] = True
+        self.response_format["message"] = "Updated"
+        return Response(self.response_format)
 
-        return super().update(request, *args, **kwargs)
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ["list", "retrieve"]:
+            queryset = self.apply_query_plan(queryset)
+        if self.action in ["update", "partial_update"]:
+            # Read by the workflow checks
+            queryset = queryset.select_related("department", "user")
+        if self.action == "list":
+            time_done_fields = [
+                field for field in Task.TIME_DONE_STATUSES if self.is_field_requested(field)
+            ]
+            if time_done_fields:
+                queryset = queryset.annotate(**Task.time_done_annotations(time_done_fields))
+                if settings.TIME_TRACKER_LIVE_HOURS:
+                    queryset = queryset.prefetch_related(
+                        Prefetch(
+                            "task_time_trackers",
+                            queryset=TimeTracker.objects.filter(
+                                status=TimeTrackerStatuses.IN_PROGRESS
+                            ),
+                            to_attr="in_progress_trackers",
+                        )
+                    )
+        return queryset
 
     def perform_destroy(self, instance):
-        instance.map_sheet.delete()
-        return super(ResponseModelViewSet, self).perform_destroy(instance)
+        map_sheet = instance.map_sheet
+        super(ResponseModelViewSet, self).perform_destroy(instance)
+        if map_sheet:
+            map_sheet.delete()
 
     def get_permissions(self):
         if self.action in [
@@ -281,6 +581,8 @@ class TaskViewSet(ResponseModelViewSet):
             "retrieve",
             "update",
             "partial_update",
+            "facets",
+            "bulk_transition",
         ]:
             permission_classes = [IsAuthenticated]
         else:
@@ -305,35 +607,83 @@ class TimeTrackerViewSet(PermissionPolicyMixin, ResponseModelViewSet):
         "destroy": [
             IsAdminUser,
         ],
+        "bulk_edit": [
+            TimeTrackerChangeIsAdminOrIsDepartmentHead,
+        ],
     }
 
-    serializer_classes = {}
+    serializer_classes = {"bulk_edit": TimeTrackerBulkEditSerializer}
     default_serializer_class = TimeTrackerSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = TimeTrackerFilter
+    cursor_ordering = ("start_time", "id")
 
     def get_queryset(self, *args, **kwargs):
-        if self.request.user.is_admin:
-            return TimeTracker.objects.all()
-        elif self.request.user.is_head_department:
-            return TimeTracker.objects.filter(
-                user__department_id=self.request.user.department.id
-            )
-        else:
-            return TimeTracker.objects.filter(user_id=self.request.user.id)
+        return TimeTracker.visible_to(self.request.user)
 
     def update(self, request, *args, **kwargs):
-        obj = self.get_object()
+        with transaction.atomic():
+            obj = self.get_object()
+            # Claimed before the neighbour trackers are changed
+            self.claim_object_version(obj)
+
+            start_time = request.data.get("start_time")
+            if start_time:
+                obj.handle_update_time(changed_time=start_time, is_start_time=True)
+
+            end_time = request.data.get("end_time")
+            if end_time:
+                obj.handle_update_time(changed_time=end_time, is_start_time=False)
+
+            return super().update(request, *args, **kwargs)
+
+    @action(detail=False, methods=["get"])
+    def timesheet(self, request, *args, **kwargs):
+        """
+        Working hours of a user per day, task and task status: ?user=&from=&to=
+        """
+        serializer = TimesheetQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data["user"]
+        # Same visibility as TimeTracker.visible_to
+        if not (
+            request.user.is_admin
+            or user.id == request.user.id
+            or (
+                request.user.is_head_department
+                and user.department_id == request.user.department_id
+            )
+        ):
+            raise PermissionDenied()
 
-        start_time = request.data.get("start_time")
-        if start_time:
-            obj.handle_update_time(changed_time=start_time, is_start_time=True)
+        data = build_timesheet(
+            user.id, serializer.validated_data["from"], serializer.validated_data["to"]
+        )
+        self.response_format["data"] = [data]
+        self.response_format["data_len"] = 1
+        self.response_format["success"] = True
+        return Response(self.response_format)
 
-        end_time = request.data.get("end_time")
-        if end_time:
-            obj.handle_update_time(changed_time=end_time, is_start_time=False)
+    @action(detail=False, methods=["post"])
+    def bulk_edit(self, request, *args, **kwargs):
+        """
+        Change start and end times of several time trackers of one task at once.
+        The whole timeline of the task is validated, nothing is saved on any error.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            timeline = TaskTimeline.load(serializer.validated_data["task"], lock=True)
+            if timeline.trackers:
+                self.check_object_permissions(request, timeline.trackers[0])
+            timeline.apply(serializer.validated_data["time_trackers"])
 
-        return super().update(request, *args, **kwargs)
+        data_list = TimeTrackerSerializer(timeline.trackers, many=True).data
+        self.response_format["data"] = data_list
+        self.response_format["data_len"] = len(data_list)
+        self.response_format["success"] = True
+        self.response_format["message"] = "Updated"
+        return Response(self.response_format)
 
 
 class CommentViewSet(ResponseModelViewSet):
@@ -344,6 +694,132 @@ class CommentViewSet(ResponseModelViewSet):
     default_serializer_class = CommentSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = CommentFilter
+    cursor_ordering = ("-created", "id")
+
+
+class ChangesView(APIView):
+    """
+    Tasks, time trackers and comments changed since the `since` token,
+    with ids of the deleted ones. Every response carries the token for the next call.
+    Rows changed within CHANGES_SYNC_OVERLAP before the token are sent again.
+    Without `since` only the token is returned: the initial state is read from
+    the paginated lists after it, not in one response.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    DELETED_KEYS = {
+        Tombstone.TASK: "tasks",
+        Tombstone.TIME_TRACKER: "time_trackers",
+        Tombstone.COMMENT: "comments",
+    }
+
+    @staticmethod
+    def _parse_since(since):
+        try:
+            return datetime.fromisoformat(since)
+        except ValueError:
+            raise ValidationError({"since": "Невірний токен синхронізації."})
+
+    def get_exception_handler(self):
+        return exception_handler
+
+    def get(self, request, format=None):
+        token = datetime.now().isoformat()
+
+        tasks = Task.objects.select_related(
+            "user__department", "department", "map_sheet", "forecast"
+        ).prefetch_related(TaskViewSet.trackers_prefetch).annotate(
+            **Task.time_done_annotations()
+        )
+        time_trackers = TimeTracker.visible_to(request.user)
+        comments = Comment.objects.select_related("user__department")
+        tombstones = Tombstone.objects.all()
+
+        if since := request.query_params.get("since"):
+            # Rows saved before the token could be committed after the previous sync
+            since = self._parse_since(since) - settings.CHANGES_SYNC_OVERLAP
+            # Time done of a task changes with its time trackers
+            tasks = tasks.filter(
+                Q(updated__gte=since)
+                | Q(id__in=TimeTracker.objects.filter(updated__gte=since).values("task_id"))
+            )
+            time_trackers = time_trackers.filter(updated__gte=since)
+            comments = comments.filter(updated__gte=since)
+            tombstones = tombstones.filter(deleted__gte=since)
+        else:
+            tasks = tasks.none()
+            time_trackers = time_trackers.none()
+            comments = comments.none()
+            tombstones = tombstones.none()
+
+        deleted = {key: [] for key in self.DELETED_KEYS.values()}
+        for model_name, object_id in tombstones.values_list("model_name", "object_id"):
+            deleted[self.DELETED_KEYS[model_name]].append(object_id)
+
+        changes = {
+            "token": token,
+            "tasks": TaskSerializer(tasks, many=True).data,
+            "time_trackers": TimeTrackerSerializer(time_trackers, many=True).data,
+            "comments": CommentSerializer(comments, many=True).data,
+            "deleted": deleted,
+        }
+        return Response(
+            ResponseInfo(
+                success=True,
+                data=[
+                    changes,
+                ],
+            ).response,
+            status=http_status.HTTP_200_OK,
+        )
+
+
+class FlowReportView(APIView):
+    """
+    Cumulative flow per day and lead/cycle time distributions: ?from=&to=&department=
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_exception_handler(self):
+        return exception_handler
+
+    def get(self, request, format=None):
+        serializer = ReportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        department = serializer.validated_data.get("department")
+        report = get_flow_report(
+            serializer.validated_data["from"],
+            serializer.validated_data["to"],
+            department.id if department else None,
+        )
+        return Response(
+            ResponseInfo(success=True, data=[report]).response,
+            status=http_status.HTTP_200_OK,
+        )
+
+
+class CapacityReportView(APIView):
+    """
+    Remaining estimates against available working hours by department, role and quarter: ?year=&department=
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_exception_handler(self):
+        return exception_handler
+
+    def get(self, request, format=None):
+        serializer = CapacityReportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        department = serializer.validated_data.get("department")
+        report = build_capacity_report(
+            serializer.validated_data["year"], department.id if department else None
+        )
+        return Response(
+            ResponseInfo(success=True, data=[report]).response,
+            status=http_status.HTTP_200_OK,
+        )
 
 
 class DefaultsView(APIView):
@@ -376,3 +852,87 @@ class DefaultsView(APIView):
             ).response,
             status=http_status.HTTP_200_OK,
         )
+
+
+class EventStreamTicketView(APIView):
+    """
+    Single-use ticket for the board events stream, passed as ?ticket=, because
+    EventSource can't send the Authorization header.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        return Response(
+            ResponseInfo(
+                success=True,
+                data=[
+                    {
+                        "ticket": issue_stream_ticket(request.user.id),
+                        "expires_in": settings.BOARD_EVENTS_TICKET_LIFETIME,
+                    },
+                ],
+            ).response,
+            status=http_status.HTTP_200_OK,
+        )
+
+
+@sync_to_async
+def _authenticate_event_stream(request):
+    """
+    User of the ?ticket= issued by EventStreamTicketView or of the Authorization header.
+    """
+    if ticket := request.GET.get("ticket"):
+        user_id = redeem_stream_ticket(ticket)
+        return User.objects.get_or_none(id=user_id) if user_id else None
+    authentication = JWTAuthentication()
+    try:
+        user_auth = authentication.authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return user_auth[0] if user_auth else None
+
+
+async def board_events(request, department_id):
+    """
+    Server-sent events stream with task, time tracker and comment changes of the department board.
+    Must be served by an ASGI server (kanban.asgi), WSGI can't stream it.
+    """
+    user = await _authenticate_event_stream(request)
+    if not user:
+        return JsonResponse(
+            ResponseInfo(success=False, message="Invalid Credentials").response,
+            status=http_status.HTTP_401_UNAUTHORIZED,
+        )
+    if not user.is_admin and user.department_id != department_id:
+        return JsonResponse(
+            ResponseInfo(
+                success=False, message="Board of another department is not available"
+            ).response,
+            status=http_status.HTTP_403_FORBIDDEN,
+        )
+
+    async def event_stream():
+        # Disconnected clients are not detected while streaming, so every stream is closed
+        # after BOARD_EVENTS_STREAM_LIFETIME and EventSource reconnects.
+        subscription = get_broker().subscribe(department_id)
+        loop = asyncio.get_running_loop()
+        stream_end = loop.time() + settings.BOARD_EVENTS_STREAM_LIFETIME
+        try:
+            yield "retry: 5000\n\n"
+            while loop.time() < stream_end:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.get(), timeout=settings.BOARD_EVENTS_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            await subscription.close()
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
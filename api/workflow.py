@@ -0,0 +1,183 @@
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from rest_framework.exceptions import ValidationError
+
+from api.choices import Statuses, UserRoles
+
+PROGRESS_STATUSES = frozenset(Statuses.STATUSES_PROGRESS())
+QUEUE_STATUSES = frozenset(Statuses.STATUSES_IDLE())
+# User of a task moved back to a queue is the last user who worked on it in the status
+QUEUE_WORK_STATUSES = MappingProxyType(
+    {
+        Statuses.EDITING_QUEUE.value: Statuses.EDITING.value,
+        Statuses.CORRECTING_QUEUE.value: Statuses.CORRECTING.value,
+        Statuses.TC_QUEUE.value: Statuses.TC.value,
+    }
+)
+
+ROLES = (None, *UserRoles.values)
+ROLE_STATUSES = {
+    UserRoles.EDITOR.value: frozenset(Statuses.EDITORS_STATUSES()),
+    UserRoles.CORRECTOR.value: frozenset(Statuses.CORRECTORS_STATUSES()),
+    UserRoles.VERIFIER.value: frozenset(Statuses.VERIFIERS_STATUSES()),
+}
+ROLE_STATUS_ERRORS = {
+    UserRoles.EDITOR.value: "Виконавець може змінити статус задачі тільки на 'Черга редагування', 'Редагування', 'Черга коректування'.",
+    UserRoles.CORRECTOR.value: "Коректор не може змінити статус задачі на 'Технічний контроль' та 'Завершено'.",
+    UserRoles.VERIFIER.value: "Контролер не може змінити статус задачі на 'Редагування' та 'Коректування'.",
+}
+# Roles that can be set as the task user in the statuses
+STATUS_ROLES = {
+    Statuses.EDITING_QUEUE.value: (UserRoles.EDITOR.value, UserRoles.CORRECTOR.value),
+    Statuses.EDITING.value: (UserRoles.EDITOR.value, UserRoles.CORRECTOR.value),
+    Statuses.CORRECTING_QUEUE.value: (UserRoles.CORRECTOR.value,),
+    Statuses.CORRECTING.value: (UserRoles.CORRECTOR.value,),
+    Statuses.TC_QUEUE.value: (UserRoles.VERIFIER.value,),
+    Statuses.TC.value: (UserRoles.VERIFIER.value,),
+}
+# Statuses in which the task user of the role can be from another department
+FOREIGN_USER_STATUSES = {
+    UserRoles.CORRECTOR.value: frozenset(
+        [
+            Statuses.EDITING_QUEUE.value,
+            Statuses.CORRECTING_QUEUE.value,
+            Statuses.CORRECTING.value,
+        ]
+    ),
+    UserRoles.VERIFIER.value: frozenset([Statuses.TC_QUEUE.value, Statuses.TC.value]),
+}
+
+
+class Transition(NamedTuple):
+    """Change of the task status with its error, if it is forbidden, and effects."""
+
+    from_status: str
+    to_status: str
+    error: Optional[dict] = None
+    changes_status: bool = False
+    # Done task goes back to work
+    reopens: bool = False
+    finishes: bool = False
+    requires_user: bool = False
+    # Work status, the last user of which becomes the task user in the queue status
+    queue_work_status: Optional[str] = None
+
+
+def _status_transition(role, is_admin, is_head, from_status, to_status):
+    error = None
+    if not is_admin and role in ROLE_STATUSES and to_status not in ROLE_STATUSES[role]:
+        error = {"status": ROLE_STATUS_ERRORS[role]}
+    changes_status = from_status != to_status
+    reopens = from_status == Statuses.DONE.value and changes_status
+    if not error and reopens and not (is_admin or is_head):
+        error = {
+            "status": "Відкрити завершену задачу може тільки адміністратор або керівник відділу."
+        }
+    return Transition(
+        from_status=from_status,
+        to_status=to_status,
+        error=error,
+        changes_status=changes_status,
+        reopens=reopens,
+        finishes=changes_status and to_status == Statuses.DONE.value,
+        requires_user=changes_status and not reopens and to_status in PROGRESS_STATUSES,
+        queue_work_status=QUEUE_WORK_STATUSES.get(to_status) if changes_status else None,
+    )
+
+
+def _assignment_error(role, status, is_admin, is_head):
+    allowed_roles = STATUS_ROLES.get(status)
+    if allowed_roles and role not in allowed_roles:
+        status_label = Statuses(status).label
+        if len(allowed_roles) > 1:
+            role_label = UserRoles(role).label if role else ""
+            message = f"Для статусу '{status_label}' не можна призначити користувача, роль якого '{role_label}'."
+        else:
+            message = f"Для статусу '{status_label}' можна призначити тільки користувача роль, якого '{UserRoles(allowed_roles[0]).label}'."
+        return {"status": message}
+    if not status and (not is_admin or is_head):
+        return {"user": "Тільки Адміністратор або Керівник віддулу може змінювати виконавця задачі."}
+    return None
+
+
+def _is_department_bound(role, status):
+    if status == Statuses.DONE.value:
+        return False
+    if role == UserRoles.EDITOR.value:
+        return True
+    return role in FOREIGN_USER_STATUSES and status not in FOREIGN_USER_STATUSES[role]
+
+
+FLAGS = (False, True)
+
+# (request user role, is_admin, is_head, from_status, to_status) -> Transition
+TRANSITIONS = MappingProxyType(
+    {
+        (role, is_admin, is_head, from_status, to_status): _status_transition(
+            role, is_admin, is_head, from_status, to_status
+        )
+        for role in ROLES
+        for is_admin in FLAGS
+        for is_head in FLAGS
+        for from_status in Statuses.values
+        for to_status in Statuses.values
+    }
+)
+
+# (task user role, new status or None, request user is_admin, is_head) -> error,
+# without the status is_head is whether the request user is head of their own department
+ASSIGNMENT_ERRORS = MappingProxyType(
+    {
+        (role, status, is_admin, is_head): _assignment_error(role, status, is_admin, is_head)
+        for role in ROLES
+        for status in (None, *Statuses.values)
+        for is_admin in FLAGS
+        for is_head in FLAGS
+    }
+)
+
+# (task user role, task status) -> the user has to be a member of the task department
+DEPARTMENT_BOUND = MappingProxyType(
+    {
+        (role, status): _is_department_bound(role, status)
+        for role in ROLES
+        for status in (None, *Statuses.values)
+    }
+)
+
+
+def is_department_bound(role, status):
+    return DEPARTMENT_BOUND.get((role, status), False)
+
+
+def transition(request_user, task, status=None, user=None):
+    """
+    Check the change of the task status and/or user made by the request user
+    and return its Transition. `status` is None when the status does not change,
+    `user` is the new task user, if it is set.
+    Raises ValidationError when the workflow forbids the change.
+    """
+    is_admin = bool(request_user.is_admin)
+    is_head = task.department.head_id == request_user.id
+    rule = TRANSITIONS.get(
+        (request_user.role, is_admin, is_head, task.status, status or task.status)
+    )
+    if rule is None:
+        # Unknown status, rejected by the serializer field
+        return None
+    if status and rule.error:
+        raise ValidationError(rule.error)
+    if user:
+        # The user without a status change is not changed by heads of any department,
+        # not only of the task department
+        assigner_is_head = is_head if status else bool(request_user.is_head_department)
+        if error := ASSIGNMENT_ERRORS.get((user.role, status, is_admin, assigner_is_head)):
+            raise ValidationError(error)
+    if rule.requires_user and not user and task.user_id != request_user.id:
+        raise ValidationError(
+            {
+                "user": f"Для переводу задачі в статус '{Statuses[rule.to_status].label}' має бути вказаний виконавець"
+            }
+        )
+    return rule
@@ -1,6 +1,7 @@
 from typing import Generator, Any
 
 import pytest
+from django.core.cache import cache
 
 from rest_framework.test import APIClient
 
@@ -173,6 +174,7 @@ def clear_table():
     models = (User, Task, Department, TimeTracker, Comment, MapSheet,)
     for model in models:
         model.objects.all().delete()
+    cache.clear()
     yield
     for model in models:
         model.objects.all().delete()
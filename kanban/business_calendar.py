@@ -0,0 +1,179 @@
+import datetime
+import threading
+from bisect import bisect_right
+from itertools import accumulate
+
+MICROSECONDS_IN_SECOND = 1_000_000
+
+
+def _time_to_microseconds(value):
+    return (
+        (value.hour * 60 + value.minute) * 60 + value.second
+    ) * MICROSECONDS_IN_SECOND + value.microsecond
+
+
+class BusinessCalendar:
+    """
+    Working time calendar: a working day with breaks on working days of the week,
+    except holidays.
+
+    Working time before every date is precomputed into a cumulative table indexed
+    by date, so the working time between any two moments is a difference of two
+    table lookups plus the part of their days, regardless of the interval length.
+    The table grows when a date outside of it is requested. It is kept with its
+    first date as one (first_ordinal, cumulative) tuple, which is replaced by a
+    single assignment, so readers without the lock always see a consistent pair.
+
+    Naive datetimes are compared as they are, aware ones are converted to UTC first,
+    the same way businesstimedelta does.
+    """
+
+    def __init__(
+        self,
+        start_time,
+        end_time,
+        working_days,
+        breaks=(),
+        holidays=(),
+        first_date=datetime.date(2020, 1, 1),
+        days=10 * 366,
+    ):
+        self.working_days = set(working_days)
+        self.holidays = holidays
+        self.intervals = self._day_intervals(start_time, end_time, breaks)
+        self.interval_starts = [start for start, end in self.intervals]
+        self.interval_prefix = [0, *accumulate(end - start for start, end in self.intervals)]
+        self.day_total = self.interval_prefix[-1]
+        self._table = (first_date.toordinal(), [0])
+        self._lock = threading.Lock()
+        self._extend(first_date.toordinal() + days)
+
+    @staticmethod
+    def _day_intervals(start_time, end_time, breaks):
+        intervals = [(_time_to_microseconds(start_time), _time_to_microseconds(end_time))]
+        for break_start, break_end in breaks:
+            break_start = _time_to_microseconds(break_start)
+            break_end = _time_to_microseconds(break_end)
+            split = []
+            for start, end in intervals:
+                if break_start > start:
+                    split.append((start, min(end, break_start)))
+                if break_end < end:
+                    split.append((max(start, break_end), end))
+            intervals = [(start, end) for start, end in split if start < end]
+        return intervals
+
+    def is_working_day(self, day):
+        return day.weekday() in self.working_days and day not in self.holidays
+
+    def working_time_of_day(self, day):
+        """Working time of the whole date in microseconds."""
+        return self.day_total if self.is_working_day(day) else 0
+
+    def _extend(self, last_ordinal):
+        # Values are only appended, so readers of the same list are not affected
+        first_ordinal, cumulative = self._table
+        total = cumulative[-1]
+        for ordinal in range(first_ordinal + len(cumulative) - 1, last_ordinal):
+            total += self.working_time_of_day(datetime.date.fromordinal(ordinal))
+            cumulative.append(total)
+
+    def _extend_back(self, first_ordinal):
+        old_first_ordinal, cumulative = self._table
+        head = [0]
+        for ordinal in range(first_ordinal, old_first_ordinal):
+            head.append(head[-1] + self.working_time_of_day(datetime.date.fromordinal(ordinal)))
+        shift = head.pop()
+        self._table = (first_ordinal, head + [value + shift for value in cumulative])
+
+    def _cover(self, *days):
+        """Grow the cumulative table to include the days and return the table."""
+        first_ordinal = min(day.toordinal() for day in days)
+        last_ordinal = max(day.toordinal() for day in days)
+        table = self._table
+        if first_ordinal >= table[0] and last_ordinal < table[0] + len(table[1]):
+            return table
+        with self._lock:
+            if first_ordinal < self._table[0]:
+                self._extend_back(first_ordinal)
+            table_first_ordinal, cumulative = self._table
+            if last_ordinal >= table_first_ordinal + len(cumulative):
+                self._extend(
+                    min(
+                        max(last_ordinal, table_first_ordinal + 2 * len(cumulative)),
+                        datetime.date.max.toordinal(),
+                    )
+                )
+            return self._table
+
+    @staticmethod
+    def _naive(moment):
+        if moment.tzinfo is not None and moment.utcoffset() is not None:
+            return moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return moment
+
+    def _time_of_day_position(self, microseconds):
+        index = bisect_right(self.interval_starts, microseconds) - 1
+        if index < 0:
+            return 0
+        start, end = self.intervals[index]
+        return self.interval_prefix[index] + min(microseconds, end) - start
+
+    def _position(self, table, moment):
+        first_ordinal, cumulative = table
+        day = moment.date()
+        position = cumulative[day.toordinal() - first_ordinal]
+        if self.is_working_day(day):
+            position += self._time_of_day_position(_time_to_microseconds(moment.time()))
+        return position
+
+    def working_seconds(self, start, end):
+        """Whole working seconds between two moments, in any order."""
+        start, end = self._naive(start), self._naive(end)
+        table = self._cover(start.date(), end.date())
+        return abs(self._position(table, end) - self._position(table, start)) // MICROSECONDS_IN_SECOND
+
+    def working_seconds_by_day(self, start, end):
+        """Working seconds between two moments split by dates, for dates with working time."""
+        start, end = sorted([self._naive(start), self._naive(end)])
+        day = start.date()
+        while day <= end.date():
+            next_day = day + datetime.timedelta(days=1)
+            seconds = self.working_seconds(
+                max(start, datetime.datetime.combine(day, datetime.time.min)),
+                min(end, datetime.datetime.combine(next_day, datetime.time.min)),
+            )
+            if seconds:
+                yield day, seconds
+            day = next_day
+
+    def add_working_seconds(self, start, seconds):
+        """
+        Moment when the working time counted from start reaches the seconds,
+        found by binary search over the cumulative table.
+        """
+        start = self._naive(start)
+        last_day = start.date()
+        while True:
+            # Positions of one table only are compared, another thread may grow it back
+            table = self._cover(start.date(), last_day)
+            target = self._position(table, start) + seconds * MICROSECONDS_IN_SECOND
+            if table[1][-1] > target:
+                break
+            last_day = datetime.date.fromordinal(table[0] + 2 * len(table[1]))
+        first_ordinal, cumulative = table
+        index = bisect_right(cumulative, target) - 1
+        day = datetime.date.fromordinal(first_ordinal + index)
+        offset = target - cumulative[index]
+        interval = bisect_right(self.interval_prefix, offset) - 1
+        microseconds = self.intervals[interval][0] + offset - self.interval_prefix[interval]
+        return datetime.datetime.combine(day, datetime.time.min) + datetime.timedelta(
+            microseconds=microseconds
+        )
+
+    def hours(self, start, end):
+        """Working hours between two moments, rounded up from half an hour."""
+        hours, seconds = divmod(self.working_seconds(start, end), 60 * 60)
+        if seconds >= 30 * 60:
+            hours += 1
+        return hours
@@ -17,9 +17,11 @@ import businesstimedelta
 import holidays as pyholidays
 import rest_framework.renderers
 import drf_standardized_errors
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 import kanban.tasks
+from kanban.business_calendar import BusinessCalendar
 
 from celery.schedules import crontab
 from holidays import country_holidays
@@ -56,6 +58,9 @@ CORS_ORIGIN_WHITELIST = (
        'http://kan.gis',
 )
 CSRF_TRUSTED_ORIGINS = CORS_ORIGIN_WHITELIST
+# Row versions of tasks and time trackers for optimistic concurrency control
+CORS_ALLOW_HEADERS = (*default_headers, "if-match")
+CORS_EXPOSE_HEADERS = ("etag",)
 
 # Application definition
 
@@ -249,16 +254,86 @@ lunch_break = businesstimedelta.LunchTimeRule(
 # business_hours = businesstimedelta.Rules([workday, lunch_break, holidays])
 business_hours = businesstimedelta.Rules([workday, lunch_break])
 
+# Той самий робочий час з попередньо обчисленою таблицею, для свят передати holidays=ua_holidays
+business_calendar = BusinessCalendar(
+    start_time=datetime.time(workday_start),
+    end_time=datetime.time(workday_end),
+    working_days=WORKING_DAYS,
+    breaks=[(datetime.time(launch_start), datetime.time(launch_end))],
+)
+
+# Години незавершених трекерів рахуються під час читання, щогодинний перерахунок у БД не потрібен.
+# Живі години додаються до часу виконання задач, звіту завантаженості та прогнозу (TaskTimeRollup.live_hours),
+# збережені hours трекерів і TaskTimeRollup лишаються сталими до завершення трекера, тому фільтри за hours їх не враховують
+TIME_TRACKER_LIVE_HOURS = os.environ.get("TIME_TRACKER_LIVE_HOURS", "0") == "1"
+
+# Нічна перевірка часових ліній трекерів, з виправленням якщо TIME_TRACKERS_AUTO_REPAIR=1
+TIME_TRACKERS_AUTO_REPAIR = os.environ.get("TIME_TRACKERS_AUTO_REPAIR", "0") == "1"
+
 CELERY_BEAT_SCHEDULE = {
-    "update_task_time_in_progress": {
-        "task": "kanban.tasks.update_task_time_in_progress",
-        "schedule": crontab(minute='0', hour='*/1'),
+    "scan_time_trackers_consistency": {
+        "task": "kanban.tasks.scan_time_trackers_consistency",
+        "schedule": crontab(minute='30', hour='2'),
+    },
+    "refresh_flow_reports": {
+        "task": "kanban.tasks.refresh_flow_reports",
+        "schedule": crontab(minute='0', hour='3'),
+    },
+    "refresh_task_forecasts": {
+        "task": "kanban.tasks.refresh_task_forecasts",
+        "schedule": crontab(minute='15', hour='*/1'),
     },
 }
+if not TIME_TRACKER_LIVE_HOURS:
+    CELERY_BEAT_SCHEDULE["update_task_time_in_progress"] = {
+        "task": "kanban.tasks.update_task_time_in_progress",
+        "schedule": crontab(minute='0', hour='*/1'),
+    }
 
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND")
 CELERY_TIMEZONE = TIME_ZONE
 
+# Board events, streamed to clients over ASGI.
+# In-process broker works for a single process only, use "api.events.RedisBroker" with several workers.
+BOARD_EVENTS_BROKER = os.environ.get("BOARD_EVENTS_BROKER", "api.events.InProcessBroker")
+BOARD_EVENTS_REDIS_URL = os.environ.get("BOARD_EVENTS_REDIS_URL", CELERY_BROKER_URL)
+BOARD_EVENTS_HEARTBEAT = 15
+BOARD_EVENTS_STREAM_LIFETIME = 300
+# Stream tickets are kept in the shared cache, so the stream may be served by another process
+BOARD_EVENTS_TICKET_LIFETIME = 30
+
+# Cache shared by web workers and Celery, so invalidations and reports precomputed
+# by Celery reach every process. Without it every process has its own memory cache.
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+
+# Closed weeks of timesheets are kept until invalidated only in the shared cache
+TIMESHEET_CACHE_TIMEOUT = None if CACHE_REDIS_URL else 60 * 5
+
+# Time trackers this close are adjacent: trackers closed and started before the status
+# change shared one timestamp are apart by the microseconds between two datetime.now() calls.
+# Such gaps are not reported by bulk_edit and scan_time_trackers does not fill them.
+TIME_TRACKERS_GAP_TOLERANCE = datetime.timedelta(seconds=1)
+
+# Changes sync sends again rows saved this long before the token, longer than any write transaction
+CHANGES_SYNC_OVERLAP = datetime.timedelta(seconds=30)
+
+TASK_FACETS_CACHE_TIMEOUT = 30
+TASKS_BULK_MAX_LENGTH = 5000
+
+# Reports are recalculated nightly by Celery beat, web workers read them from the shared cache (CACHE_REDIS_URL)
+REPORTS_CACHE_TIMEOUT = 60 * 60 * 24
+REPORTS_DEFAULT_DAYS = 30
+
+# Groups of done tasks with fewer samples are not used to forecast ETA of open tasks
+TASK_FORECAST_MIN_SAMPLES = 5
+
 # DATES
 CURRENT_YEAR = datetime.date.today().year
@@ -10,3 +10,28 @@ def update_task_time_in_progress():
 
     result = update_time_trackers_hours()
     logger.info(result)
+
+
+@shared_task
+def scan_time_trackers_consistency():
+    from api.timeline import TimelineScanner
+    from django.conf import settings
+
+    scanner = TimelineScanner(repair=settings.TIME_TRACKERS_AUTO_REPAIR)
+    for anomaly in scanner.scan():
+        logger.warning(anomaly)
+    logger.info(f"Time trackers anomalies: {dict(scanner.counts)}, repaired: {scanner.repaired}")
+
+
+@shared_task
+def refresh_flow_reports():
+    from api.reports import refresh_flow_reports
+
+    logger.info(f"Refreshed {refresh_flow_reports()} flow reports")
+
+
+@shared_task
+def refresh_task_forecasts():
+    from api.forecast import refresh_task_forecasts
+
+    logger.info(f"Refreshed forecasts of {refresh_task_forecasts()} open tasks")